@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
-import dj_database_url
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,6 +20,10 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# pulse_common, the code both services share, sits next to the project.
+sys.path.append(str(BASE_DIR.parent))
+from pulse_common import database  # noqa: E402
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -52,6 +56,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware too.
+    'pulse_common.instrumentation.PerformanceMiddleware',
+    'pulse_common.routers.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -93,23 +100,18 @@ WSGI_APPLICATION = 'PAYMENTS.wsgi.application'
 #     )
 # }
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Connection reuse, pooling and timeouts are set through DB_* environment
+# variables; see pulse_common/database.py.
+DATABASES = {
+    "default": database.default_database("PulseDB"),
+    **database.replica_databases(),
+}
 
-if DATABASE_URL:
-    DATABASES = {
-        "default": dj_database_url.config(default=DATABASE_URL)
-    }
-else:
-    DATABASES = {
-        "default": {
-            "ENGINE": "django.db.backends.postgresql",
-            "NAME": os.getenv("DB_NAME", "PulseDB"),
-            "USER": os.getenv("DB_USER", "postgres"),
-            "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
-            "HOST": os.getenv("DB_HOST", "localhost"),
-            "PORT": os.getenv("DB_PORT", "5432"),
-        }
-    }
+# Safe reads go to the replicas (if any). A client that wrote reads from the
+# primary for DATABASE_REPLICA_PIN_SECONDS so it always sees its own writes.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["pulse_common.routers.ReplicaRouter"]
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", "5"))
 
 # Optional: ensure test database name is set properly when running tests
 import sys
@@ -163,3 +165,80 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SWAGGER_USE_COMPAT_RENDERERS = False
 
+REST_FRAMEWORK = {
+    # orjson-backed JSON; both fall back to the stdlib json versions without orjson.
+    'DEFAULT_RENDERER_CLASSES': [
+        'pulse_common.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'pulse_common.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+
+# Cache shared by all workers (idempotency replays); set REDIS_URL in production.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Stored responses for Idempotency-Key replays live this long (seconds); a
+# duplicate that arrives mid-request waits up to IDEMPOTENCY_LOCK_TIMEOUT.
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 10))
+# A key whose request never finished (e.g. the worker was killed) is free
+# again after IDEMPOTENCY_LEASE seconds; keep it above the slowest request.
+IDEMPOTENCY_LEASE = int(os.getenv("IDEMPOTENCY_LEASE", 60))
+
+# How new payments reach their gateway: 'background' hands them to the in-process
+# asyncio dispatcher, 'outbox' queues them durably for `manage.py process_payments`.
+PAYMENT_DISPATCH_MODE = os.getenv('PAYMENT_DISPATCH_MODE', 'background')
+
+# Partition the payments table by month of created_at when migrating (PostgreSQL
+# only); `manage.py partition_payments` does the same later and adds new months.
+PAYMENT_PARTITIONING = os.getenv("PAYMENT_PARTITIONING", "false").lower() == "true"
+
+# GET /api/v1/payments/{id}/ is served from a per-payment cache: each worker's
+# in-process LRU in front of the shared cache. Payments are cached for
+# PAYMENT_CACHE_TIMEOUT and refreshed when their status changes; a worker's local
+# copy of a pending payment lives PAYMENT_CACHE_LOCAL_TTL seconds, so other
+# workers see a new status at most that late. Without REDIS_URL the "shared"
+# cache is per process, and pending payments expire there just as fast.
+PAYMENT_CACHE_TIMEOUT = int(os.getenv("PAYMENT_CACHE_TIMEOUT", 300))
+PAYMENT_CACHE_LOCAL_TTL = float(os.getenv("PAYMENT_CACHE_LOCAL_TTL", "1"))
+PAYMENT_CACHE_LOCAL_SIZE = int(os.getenv("PAYMENT_CACHE_LOCAL_SIZE", 10000))
+
+# Payment gateway adapters, keyed on the Payment.PAYMENT_GATEWAYS codes.
+# Until the real integrations land every gateway uses the offline fake adapter;
+# FAKE_GATEWAY_LATENCY (seconds) simulates a slow gateway for load tests.
+PAYMENT_GATEWAY_ADAPTERS = {
+    code: {
+        'BACKEND': 'VendorPays.gateways.FakeGatewayAdapter',
+        'MAX_CONCURRENCY': int(os.getenv('GATEWAY_MAX_CONCURRENCY', '10')),
+        'TIMEOUT': float(os.getenv('GATEWAY_TIMEOUT', '30')),
+        'OPTIONS': {'latency': float(os.getenv('FAKE_GATEWAY_LATENCY', '0'))},
+    }
+    for code in ('paypal', 'paystack', 'flutterwave')
+}
+
+# Fraction of requests broken down into DB/serializer/render time in a
+# Server-Timing header and the /metrics counters. Every request is still timed.
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.1"))
+
+# Seconds between a worker's metrics snapshots in the shared cache; /metrics
+# reports every worker's, each with a worker label.
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
@@ -6,6 +6,8 @@ from rest_framework import permissions
 from django.conf.urls.static import static
 from django.conf import settings
 
+from pulse_common.instrumentation import metrics_view
+
 schema_view = get_schema_view(
    openapi.Info(
       title="Payment Gateway API",
@@ -19,6 +21,7 @@ schema_view = get_schema_view(
 urlpatterns = [
    path('admin/', admin.site.urls),
    path('api/', include('VendorPays.urls')),
+   path('metrics', metrics_view, name='metrics'),
    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
    path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
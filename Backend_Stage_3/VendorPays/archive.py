@@ -0,0 +1,78 @@
+import json
+import zlib
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, PaymentArchive
+
+FIELDS = [field.attname for field in Payment._meta.concrete_fields]
+
+
+def encode(rows):
+    return zlib.compress(json.dumps(rows, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), 9)
+
+
+def decode(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def to_payment(row):
+    """An (unsaved) Payment built from an archived row."""
+    return Payment(**{
+        name: Payment._meta.get_field(name).to_python(value) for name, value in row.items() if name in FIELDS
+    })
+
+
+def archive_completed(before, chunk_size=1000):
+    """
+    Move completed payments created before ``before`` into PaymentArchive
+    chunks of up to ``chunk_size`` rows, one transaction per chunk. Returns
+    the number of payments moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Payment.objects.filter(status='completed', created_at__lt=before)
+                .order_by('id').values(*FIELDS)[:chunk_size]
+            )
+            if not rows:
+                return moved
+            months = defaultdict(list)
+            for row in rows:
+                months[timezone.localdate(row['created_at']).replace(day=1)].append(row)
+            PaymentArchive.objects.bulk_create([
+                PaymentArchive(
+                    month=month, first_id=chunk[0]['id'], last_id=chunk[-1]['id'],
+                    count=len(chunk), data=encode(chunk),
+                )
+                for month, chunk in months.items()
+            ])
+            Payment.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+
+
+def find(payment_id):
+    """An archived payment by id, or None."""
+    payment_id = int(payment_id)
+    chunks = PaymentArchive.objects.filter(first_id__lte=payment_id, last_id__gte=payment_id).only('data')
+    for chunk in chunks:
+        for row in decode(chunk.data):
+            if row['id'] == payment_id:
+                return to_payment(row)
+    return None
+
+
+def payments(since=None):
+    """Every archived payment (created on or after ``since``, a datetime)."""
+    chunks = PaymentArchive.objects.order_by('id').only('data')
+    if since is not None:
+        chunks = chunks.filter(month__gte=timezone.localdate(since).replace(day=1))
+    for chunk in chunks.iterator():
+        for row in decode(chunk.data):
+            payment = to_payment(row)
+            if since is None or payment.created_at >= since:
+                yield payment
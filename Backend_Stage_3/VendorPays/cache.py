@@ -0,0 +1,171 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from pulse_common import instrumentation
+from .serializers import PaymentSerializer
+
+# record_result() never changes a payment once it has left 'pending'.
+FINAL_STATUSES = ('completed', 'failed')
+
+
+class LocalCache:
+    """
+    Per-process LRU tier in front of the shared cache.
+
+    Other workers can't invalidate it, so each entry carries its own expiry
+    (see ``ttl_for``).
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local = LocalCache(getattr(settings, 'PAYMENT_CACHE_LOCAL_SIZE', 10000))
+
+
+def get_timeout():
+    return getattr(settings, 'PAYMENT_CACHE_TIMEOUT', 300)
+
+
+def cache_key(payment_id):
+    return f'payments:payment:{payment_id}'
+
+
+def make_entry(data):
+    data = dict(data)
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return {'data': data, 'status': data['status'], 'etag': f'"{hashlib.md5(body).hexdigest()}"'}
+
+
+def cache_is_shared():
+    # LocMemCache lives in one process: whoever settles a payment elsewhere
+    # (an outbox worker, another gunicorn worker) can't update it.
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def ttl_for(entry, shared=False):
+    """
+    Final payments stay cached for PAYMENT_CACHE_TIMEOUT. So do pending ones
+    in a shared cache, where record_result() stores the new status on commit;
+    locally, and in a per-process cache, they expire after
+    PAYMENT_CACHE_LOCAL_TTL so readers pick up status changes made elsewhere.
+    """
+    if entry['status'] in FINAL_STATUSES or (shared and cache_is_shared()):
+        return get_timeout()
+    return getattr(settings, 'PAYMENT_CACHE_LOCAL_TTL', 1.0)
+
+
+def share(key, entry, add=False):
+    # Redis only takes whole seconds.
+    timeout = math.ceil(ttl_for(entry, shared=True))
+    if add:
+        return cache.add(key, entry, timeout)
+    cache.set(key, entry, timeout)
+    return True
+
+
+def remember(key, entry):
+    local.set(key, entry, ttl_for(entry))
+
+
+def get_entry(payment_id):
+    """The cached entry for a payment from either tier, or None."""
+    key = cache_key(payment_id)
+    entry = local.get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is not None:
+            remember(key, entry)
+    return entry
+
+
+def load_entry(payment, data=None):
+    """Cache a payment just read from (or written to) the database."""
+    key = cache_key(payment.pk)
+    entry = make_entry(data if data is not None else PaymentSerializer(payment).data)
+    # add, not set: a status change stored meanwhile is newer than this read.
+    if not share(key, entry, add=True):
+        entry = cache.get(key) or entry
+    remember(key, entry)
+    return entry
+
+
+def payment_changed(payment):
+    """Store a payment's new representation, for every worker, after a status change."""
+    key = cache_key(payment.pk)
+    entry = make_entry(PaymentSerializer(payment).data)
+    share(key, entry)
+    remember(key, entry)
+
+
+def wait_for_change(payment_id, entry, seconds, reload):
+    """
+    Block for up to ``seconds`` while a payment stays in ``entry``'s state.
+
+    Polls the shared cache with a growing interval, and calls ``reload()`` to
+    read the payment from the database again once the pending entry has
+    expired there. Returns the newest entry, or None if the payment is gone.
+    """
+    key = cache_key(payment_id)
+    deadline = time.monotonic() + seconds
+    interval = 0.05
+    while entry['status'] not in FINAL_STATUSES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, 1.0)
+        current = cache.get(key)
+        if current is None:
+            current = reload()
+            if current is None:
+                return None
+        if current['etag'] != entry['etag']:
+            remember(key, current)
+            return current
+    return entry
+
+
+def entry_response(request, entry, hit):
+    """Build the response for a cached entry, honouring If-None-Match."""
+    instrumentation.record_cache(hit)
+    headers = {'ETag': entry['etag'], 'X-Cache': 'HIT' if hit else 'MISS'}
+    if_none_match = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+    if entry['etag'] in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entry['data'], status=status.HTTP_200_OK, headers=headers)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from pulse_common import routers
+
+from . import rollups
+from . import cache as payment_cache
+from .gateways import GatewayResult, load_adapters
+from .models import Payment, PaymentOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def record_result(payment_id, result):
+    """Move a pending payment to its final status. Returns True if it changed."""
+    new_status = 'completed' if result.success else 'failed'
+    with transaction.atomic(savepoint=False):
+        updated = Payment.objects.filter(pk=payment_id, status='pending').update(status=new_status)
+        if updated:
+            payment = Payment.objects.get(pk=payment_id)
+            rollups.status_changed(payment, 'pending', new_status)
+            transaction.on_commit(lambda: payment_cache.payment_changed(payment))
+    return bool(updated)
+
+
+def database_call(func):
+    """
+    Wrap a self-contained ORM call for the dispatcher's event loop.
+
+    Unlike the default thread_sensitive=True, the call runs on any thread of
+    the loop's executor instead of the single thread shared by every
+    thread-sensitive call in the process, so concurrent dispatches don't
+    queue behind one another. Connections are recycled around each call, as
+    Django does around a request, since nothing else does in those threads.
+    """
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+class PaymentDispatcher:
+    """
+    Sends pending payments to their gateway adapters off the request thread.
+
+    The dispatcher owns one asyncio event loop running in a daemon thread;
+    ``submit()`` is safe to call from any (sync) thread and returns a
+    ``concurrent.futures.Future``. Each gateway has its own adapter, so a slow
+    gateway only exhausts its own connection pool.
+    """
+    def __init__(self, adapters=None):
+        self._adapters = adapters
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def adapters(self):
+        if self._adapters is None:
+            self._adapters = load_adapters()
+        return self._adapters
+
+    def start(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name='payment-dispatcher', daemon=True
+                )
+                thread.start()
+                self._loop = loop
+        return self._loop
+
+    def submit(self, payment_id):
+        loop = self.start()
+        return asyncio.run_coroutine_threadsafe(self._dispatch_in_background(payment_id), loop)
+
+    async def _dispatch_in_background(self, payment_id):
+        try:
+            # The payment was just inserted; a replica may not have it yet.
+            with routers.primary():
+                return await self.dispatch(payment_id)
+        except Exception:
+            logger.exception('Dispatch of payment %s failed.', payment_id)
+            raise
+
+    async def dispatch(self, payment_id):
+        payment = await database_call(Payment.objects.get)(pk=payment_id)
+        adapter = self.adapters[payment.gateway]
+        try:
+            result = await adapter.process(payment)
+        except Exception as exc:
+            logger.warning('Gateway %s failed for payment %s: %r', payment.gateway, payment_id, exc)
+            result = GatewayResult(False, str(exc) or exc.__class__.__name__)
+        await database_call(record_result)(payment_id, result)
+        return result
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = PaymentDispatcher()
+        return _dispatcher
+
+
+def dispatch_payments(payments):
+    """
+    Queue freshly inserted payments for gateway processing.
+
+    With ``PAYMENT_DISPATCH_MODE = 'outbox'`` an outbox row is written in the
+    caller's transaction and ``manage.py process_payments`` picks it up;
+    otherwise the in-process dispatcher is handed the ids once the
+    transaction commits.
+    """
+    if getattr(settings, 'PAYMENT_DISPATCH_MODE', 'background') == 'outbox':
+        PaymentOutbox.objects.bulk_create([PaymentOutbox(payment=payment) for payment in payments])
+        return
+
+    dispatcher = get_dispatcher()
+    payment_ids = [payment.pk for payment in payments]
+
+    def submit():
+        for payment_id in payment_ids:
+            dispatcher.submit(payment_id)
+
+    transaction.on_commit(submit)
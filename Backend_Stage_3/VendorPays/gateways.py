@@ -0,0 +1,159 @@
+import abc
+import asyncio
+import random
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import Payment
+
+
+@dataclass
+class GatewayResult:
+    success: bool
+    message: str = ''
+
+
+class GatewayError(Exception):
+    """Raised by an adapter when the gateway could not process the charge."""
+
+
+class ConnectionPool:
+    """
+    A small asyncio pool of gateway connections.
+
+    At most ``max_size`` connections exist at once, so the pool size is also
+    the concurrency limit for the gateway: callers wait in ``acquire()``
+    until a connection is handed back.
+    """
+    def __init__(self, adapter, max_size):
+        self.adapter = adapter
+        self.max_size = max_size
+        self._idle = []
+        self._size = 0
+        self._available = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._available:
+            while not self._idle and self._size >= self.max_size:
+                await self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+        try:
+            return await self.adapter.open_connection()
+        except BaseException:
+            async with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+    async def release(self, connection, discard=False):
+        if discard:
+            await self.adapter.close_connection(connection)
+        async with self._available:
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append(connection)
+            self._available.notify()
+
+    async def close(self):
+        async with self._available:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection in idle:
+            await self.adapter.close_connection(connection)
+
+
+class GatewayAdapter(abc.ABC):
+    """
+    Base class for payment gateway integrations.
+
+    Subclasses implement ``charge()`` and, if the gateway client keeps
+    sessions open, ``open_connection()``/``close_connection()``.
+    Adapters must be created and used from the dispatcher's event loop.
+    """
+    def __init__(self, code, max_concurrency=10, timeout=30.0, **options):
+        self.code = code
+        self.timeout = timeout
+        self.options = options
+        self.pool = ConnectionPool(self, max_concurrency)
+
+    async def open_connection(self):
+        return None
+
+    async def close_connection(self, connection):
+        return None
+
+    @abc.abstractmethod
+    async def charge(self, connection, payment):
+        """Charge ``payment`` over ``connection`` and return a GatewayResult."""
+
+    async def process(self, payment):
+        connection = await self.pool.acquire()
+        discard = False
+        try:
+            return await asyncio.wait_for(self.charge(connection, payment), self.timeout)
+        except BaseException:
+            # The connection may be mid-request; don't hand it to the next charge.
+            discard = True
+            raise
+        finally:
+            await self.pool.release(connection, discard=discard)
+
+
+class FakeGatewayAdapter(GatewayAdapter):
+    """
+    Offline stand-in for a real gateway, used for tests and benchmarks.
+
+    ``latency`` is the simulated round trip in seconds (``jitter`` adds up to
+    that much extra at random) and ``failure_rate`` the share of declined charges.
+    """
+    def __init__(self, code, latency=0.0, jitter=0.0, failure_rate=0.0, **kwargs):
+        super().__init__(code, **kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    async def charge(self, connection, payment):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.failure_rate:
+            return GatewayResult(False, f'{self.code} declined the charge.')
+        return GatewayResult(True, f'{self.code} accepted the charge.')
+
+
+def get_gateway_config():
+    """
+    Return the adapter configuration for every gateway in Payment.PAYMENT_GATEWAYS.
+
+    ``settings.PAYMENT_GATEWAY_ADAPTERS`` maps a gateway code to a dict with
+    ``BACKEND`` (dotted path), ``MAX_CONCURRENCY``, ``TIMEOUT`` and ``OPTIONS``.
+    Gateways without an entry fall back to FakeGatewayAdapter.
+    """
+    configured = getattr(settings, 'PAYMENT_GATEWAY_ADAPTERS', {})
+    config = {}
+    for code, _label in Payment.PAYMENT_GATEWAYS:
+        entry = {
+            'BACKEND': 'VendorPays.gateways.FakeGatewayAdapter',
+            'MAX_CONCURRENCY': 10,
+            'TIMEOUT': 30.0,
+            'OPTIONS': {},
+        }
+        entry.update(configured.get(code, {}))
+        config[code] = entry
+    return config
+
+
+def load_adapters():
+    adapters = {}
+    for code, entry in get_gateway_config().items():
+        adapter_class = import_string(entry['BACKEND'])
+        adapters[code] = adapter_class(
+            code,
+            max_concurrency=entry['MAX_CONCURRENCY'],
+            timeout=entry['TIMEOUT'],
+            **entry['OPTIONS'],
+        )
+    return adapters
@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from pulse_common import instrumentation
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+
+def _lock_timeout():
+    return getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 10)
+
+
+def _lease():
+    return getattr(settings, 'IDEMPOTENCY_LEASE', 60)
+
+
+def _cache_key(key):
+    return 'idempotency:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method}:{request.path}:{payload}'.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': f'{IDEMPOTENCY_HEADER} was already used with a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored['body'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def _store(record, response):
+    record.response_status = response.status_code
+    record.response_body = response.data
+    record.expires_at = timezone.now() + timedelta(seconds=_ttl())
+    # An update, not save(): the row is gone if the lease ran out and a retry reclaimed it.
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        response_status=record.response_status,
+        response_body=record.response_body,
+        expires_at=record.expires_at,
+    )
+    cache.set(
+        _cache_key(record.key),
+        {'fingerprint': record.fingerprint, 'status': record.response_status, 'body': record.response_body},
+        _ttl(),
+    )
+
+
+def _load_completed(key):
+    """Return the stored response for ``key`` from the cache, then the database."""
+    stored = cache.get(_cache_key(key))
+    if stored is not None:
+        return stored
+    record = IdempotencyKey.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+    if record is None or record.response_status is None:
+        return None
+    stored = {'fingerprint': record.fingerprint, 'status': record.response_status, 'body': record.response_body}
+    cache.set(_cache_key(key), stored, max(int((record.expires_at - timezone.now()).total_seconds()), 1))
+    return stored
+
+
+def _claim(key, fingerprint):
+    """
+    Insert the key's row; returns it, or None when another request holds the key.
+
+    Until the response is stored, ``expires_at`` is only a short lease, so the
+    key of a worker killed mid-request frees up after IDEMPOTENCY_LEASE
+    seconds rather than the full TTL.
+    """
+    expires_at = timezone.now() + timedelta(seconds=_lease())
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, fingerprint=fingerprint, expires_at=expires_at)
+    except IntegrityError:
+        pass
+    # Expired keys and lapsed leases are reclaimed lazily.
+    if IdempotencyKey.objects.filter(key=key, expires_at__lte=timezone.now()).delete()[0]:
+        return _claim(key, fingerprint)
+    return None
+
+
+def idempotent(view_method):
+    """
+    Make a POST view method safe to retry with an ``Idempotency-Key`` header.
+
+    The first request with a given key is processed normally and its response
+    (anything but a 5xx) is stored in the cache and the IdempotencyKey table.
+    Retries are answered from there without running the view again. A retry
+    that arrives while the first request is still running waits for it, for
+    up to IDEMPOTENCY_LOCK_TIMEOUT seconds, instead of racing it.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {'detail': f'{IDEMPOTENCY_HEADER} must be at most 255 characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = _fingerprint(request)
+        stored = cache.get(_cache_key(key))
+        instrumentation.record_cache(stored is not None)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        deadline = time.monotonic() + _lock_timeout()
+        delay = 0.05
+        while True:
+            record = _claim(key, fingerprint)
+            if record is not None:
+                break
+            stored = _load_completed(key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'detail': 'A request with this Idempotency-Key is still being processed.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            # Server errors are not final; let the client retry for real.
+            record.delete()
+        else:
+            _store(record, response)
+        return response
+
+    return wrapper
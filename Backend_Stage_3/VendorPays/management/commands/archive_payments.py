@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Move old completed payments into compressed archive chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=90,
+                            help='Archive completed payments created more than this many days ago.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Payments per compressed archive chunk (and transaction).')
+
+    def handle(self, *args, **options):
+        from VendorPays import archive, partitions
+
+        if options['older_than_days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--older-than-days and --chunk-size must be positive.')
+        before = timezone.now() - timedelta(days=options['older_than_days'])
+        moved = archive.archive_completed(before, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} payments created before {before:%Y-%m-%d}.'))
+        # On a partitioned table, months with nothing left in them go away entirely.
+        for name in partitions.drop_empty_partitions(connection, timezone.localdate(before)):
+            self.stdout.write(f'Dropped empty partition {name}.')
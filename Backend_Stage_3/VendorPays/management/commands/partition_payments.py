@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = 'Partition the payments table by month (PostgreSQL) and create upcoming partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Monthly partitions to create beyond the current month.')
+
+    def handle(self, *args, **options):
+        from VendorPays import partitions
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('Payment partitioning needs PostgreSQL.')
+        if partitions.partition_table(connection, months_ahead=options['months_ahead']):
+            self.stdout.write(self.style.SUCCESS('Converted the payments table to monthly partitions.'))
+        else:
+            partitions.ensure_partitions(connection, months_ahead=options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS('Payment partitions are in place.'))
@@ -0,0 +1,85 @@
+import logging
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(options):
+    """Drain (or keep polling) the outbox in the current process."""
+    from VendorPays.outbox import OutboxWorker
+
+    worker = OutboxWorker(
+        batch_size=options['batch_size'],
+        max_attempts=options['max_attempts'],
+        lease_seconds=options['lease'],
+    )
+    handled = 0
+    try:
+        while True:
+            try:
+                count = worker.run_once()
+            except OperationalError:
+                # Lost connection or lock timeout: claimed rows come back after their lease.
+                logger.exception('Outbox batch failed; retrying after %ss.', options['poll_interval'])
+                connections.close_all()
+                time.sleep(options['poll_interval'])
+                continue
+            handled += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+    finally:
+        worker.close()
+    return handled
+
+
+def worker_process(options):
+    """Entry point for pool processes, which may be spawned without Django set up."""
+    import django
+    django.setup()
+    try:
+        return run_worker(options)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Send pending payments from the outbox to their gateways.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: one per CPU).')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Outbox rows claimed per batch.')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Gateway attempts before a payment is marked failed.')
+        parser.add_argument('--lease', type=int, default=300,
+                            help='Seconds a claimed row stays invisible to other workers.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the outbox is drained instead of polling.')
+
+    def handle(self, *args, **options):
+        worker_options = {
+            key: options[key]
+            for key in ('batch_size', 'max_attempts', 'lease', 'poll_interval', 'once')
+        }
+        processes = max(options['processes'], 1)
+        if processes == 1:
+            handled = [run_worker(worker_options)]
+        else:
+            # Children must not inherit this process's database connections.
+            connections.close_all()
+            with multiprocessing.Pool(processes) as pool:
+                handled = pool.map(worker_process, [worker_options] * processes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {sum(handled)} outbox entries with {processes} worker(s).'
+        ))
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily payment rollups from the payments table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', metavar='YYYY-MM-DD',
+                            help='Only rebuild days from this one on (default: all of history).')
+
+    def handle(self, *args, **options):
+        from VendorPays import rollups
+
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date like 2024-01-31.')
+        written = rollups.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} rollup rows' + (f' from {since}.' if since else '.')
+        ))
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:27
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_created_at(apps, schema_editor):
+    """
+    Payments had no timestamp before this migration, so AddField stamps every
+    existing one with the migration time. Where an outbox row or a stored
+    idempotent response shows when a payment was made, use that instead.
+    The rest keep the migration time: rollups count them on that day, and
+    partitioning and archiving treat them as created then.
+    """
+    Payment = apps.get_model('VendorPays', 'Payment')
+    PaymentOutbox = apps.get_model('VendorPays', 'PaymentOutbox')
+    IdempotencyKey = apps.get_model('VendorPays', 'IdempotencyKey')
+    db = schema_editor.connection.alias
+    known = {}
+    for body, created_at in IdempotencyKey.objects.using(db).values_list('response_body', 'created_at').iterator():
+        # POST /payments/ stores one payment, POST /payments/bulk/ a list.
+        for item in body if isinstance(body, list) else [body]:
+            if isinstance(item, dict) and isinstance(item.get('id'), int):
+                known[item['id']] = min(created_at, known.get(item['id'], created_at))
+    for payment_id, created_at in PaymentOutbox.objects.using(db).values_list('payment_id', 'created_at').iterator():
+        known[payment_id] = min(created_at, known.get(payment_id, created_at))
+    Payment.objects.using(db).bulk_update(
+        [Payment(pk=payment_id, created_at=created_at) for payment_id, created_at in known.items()],
+        ['created_at'], batch_size=1000,
+    )
+
+
+def backfill_rollups(apps, schema_editor):
+    Payment = apps.get_model('VendorPays', 'Payment')
+    PaymentDailyRollup = apps.get_model('VendorPays', 'PaymentDailyRollup')
+    db = schema_editor.connection.alias
+    cells = (
+        Payment.objects.using(db).order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'gateway', 'status')
+        .annotate(count=Count('id'), total=Sum('amount'))
+    )
+    PaymentDailyRollup.objects.using(db).bulk_create(
+        (PaymentDailyRollup(**row) for row in cells.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VendorPays', '0005_payment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='PaymentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('gateway', models.CharField(choices=[('paypal', 'PayPal'), ('paystack', 'Paystack'), ('flutterwave', 'Flutterwave')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'gateway', 'status'), name='payment_rollup_cell')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,164 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:29
+
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# A frozen copy of VendorPays.partitions.partition_table() as it was when this
+# migration was written, so that later changes to that module or the models
+# don't change what this migration does.
+TABLE = 'VendorPays_payment'
+OUTBOX = 'VendorPays_paymentoutbox'
+MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_partition(cursor, quote, month):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(f"{TABLE}_p{month:%Y%m}")} PARTITION OF {quote(TABLE)} '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def keep_transaction_ids_unique(cursor, quote, legacy):
+    ids = quote(f'{TABLE}_transaction_ids')
+    function = quote(f'{TABLE}_claim_transaction_id')
+    cursor.execute(
+        'SELECT format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = %s',
+        [quote(legacy), 'transaction_id'],
+    )
+    column_type = cursor.fetchone()[0]
+    cursor.execute(f'CREATE TABLE {ids} (transaction_id {column_type} PRIMARY KEY)')
+    cursor.execute(f"""
+        CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                TRUNCATE {ids};
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' AND OLD.transaction_id IS NOT NULL THEN
+                DELETE FROM {ids} WHERE transaction_id = OLD.transaction_id;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.transaction_id IS NOT NULL THEN
+                INSERT INTO {ids} VALUES (NEW.transaction_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute(
+        f'CREATE TRIGGER {quote(f"{TABLE}_transaction_id")} AFTER INSERT OR UPDATE OF transaction_id OR DELETE '
+        f'ON {quote(TABLE)} FOR EACH ROW EXECUTE FUNCTION {function}()'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {quote(f"{TABLE}_truncate_transaction_ids")} AFTER TRUNCATE '
+        f'ON {quote(TABLE)} FOR EACH STATEMENT EXECUTE FUNCTION {function}()'
+    )
+
+
+def partition_payments(apps, schema_editor):
+    # Opt-in: PAYMENT_PARTITIONING=true, PostgreSQL only.
+    if not getattr(settings, 'PAYMENT_PARTITIONING', False) or schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.connection.ops.quote_name
+    legacy = f'{TABLE}_unpartitioned'
+    sequence = f'{TABLE}_part_id_seq'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [quote(TABLE)])
+        if cursor.fetchone()[0] == 'p':
+            return
+        cursor.execute(f'LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        # Read the indexes and constraints to recreate while they still name the table.
+        cursor.execute(
+            'SELECT pg_get_indexdef(i.indexrelid), i.indisunique, i.indisprimary, '
+            'ARRAY(SELECT a.attname::text FROM pg_attribute a WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)) '
+            'FROM pg_index i WHERE i.indrelid = to_regclass(%s)',
+            [quote(TABLE)],
+        )
+        indexes = [definition for definition, unique, primary, columns in cursor.fetchall()
+                   if not primary and not (unique and columns == ['transaction_id'])]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype IN ('c', 'f')",
+            [quote(TABLE)],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            'SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND confrelid = to_regclass(%s)',
+            [quote(OUTBOX), quote(TABLE)],
+        )
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {quote(OUTBOX)} DROP CONSTRAINT {quote(constraint)}')
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(legacy)}')
+
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(TABLE)} (LIKE {quote(legacy)} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{quote(sequence)}')")
+        cursor.execute(f'ALTER SEQUENCE {quote(sequence)} OWNED BY {quote(TABLE)}.id')
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, created_at)')
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}')
+
+        cursor.execute(f'SELECT MIN(created_at) FROM {quote(legacy)}')
+        oldest = cursor.fetchone()[0]
+        month = month_start(oldest) if oldest is not None else month_start(timezone.now())
+        last = add_months(month_start(timezone.now()), MONTHS_AHEAD)
+        while month <= last:
+            create_partition(cursor, quote, month)
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {quote(TABLE + "_default")} PARTITION OF {quote(TABLE)} DEFAULT')
+
+        keep_transaction_ids_unique(cursor, quote, legacy)
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(legacy)}')
+        cursor.execute(f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {quote(TABLE)}', [quote(sequence)])
+        cursor.execute(f'DROP TABLE {quote(legacy)}')
+        # Index names are free again now that the old table is gone.
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VendorPays', '0006_payment_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentarchive',
+            index=models.Index(fields=['first_id', 'last_id'], name='payment_archive_ids_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentarchive',
+            index=models.Index(fields=['month'], name='payment_archive_month_idx'),
+        ),
+        migrations.RunPython(partition_payments, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,28 @@
+import os
+import time
+
 from django.db import models
-from django.db import models
+from django.utils import timezone
+
+# Crockford base32, so transaction references sort by creation time.
+_ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+
+def generate_transaction_id(gateway):
+    """
+    Build a '<GATEWAY>-TX-<ulid>' reference before the row is inserted.
+
+    The suffix is a ULID (48-bit millisecond timestamp + 80 random bits), so
+    references are unique without knowing the autoincrement id and stay
+    roughly ordered by creation time.
+    """
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), 'big')
+    chars = []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        chars.append(_ULID_ALPHABET[index])
+    return f"{gateway.upper()}-TX-{''.join(reversed(chars))}"
+
 
 class Payment(models.Model):
     PAYMENT_GATEWAYS = (
@@ -13,7 +36,102 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     gateway = models.CharField(max_length=20, choices=PAYMENT_GATEWAYS, default='paystack')
     status = models.CharField(max_length=20, default='pending')
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Reconciliation filters; the trailing id serves the keyset ordering.
+            models.Index(fields=['status', 'gateway', 'id'], name='payment_status_gateway_idx'),
+            models.Index(fields=['email', 'id'], name='payment_email_idx'),
+            # Finds settled payments old enough to archive.
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.amount}"
+
+
+class PaymentArchive(models.Model):
+    """
+    A chunk of completed payments moved out of the payments table by
+    ``manage.py archive_payments``: their rows as zlib-compressed JSON.
+
+    Chunks never mix months; ``first_id``/``last_id`` bound the payment ids
+    inside, so a payment is found again by id without decompressing much.
+    """
+    month = models.DateField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['first_id', 'last_id'], name='payment_archive_ids_idx'),
+            models.Index(fields=['month'], name='payment_archive_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} payments from {self.month:%Y-%m} ({self.first_id}-{self.last_id})"
+
+
+class PaymentDailyRollup(models.Model):
+    """
+    Payment count and amount per day (of ``Payment.created_at``), gateway and
+    status.
+
+    Kept current in the same transaction as every payment insert and status
+    change (see rollups.py), so reports never scan the payments table.
+    """
+    day = models.DateField()
+    gateway = models.CharField(max_length=20, choices=Payment.PAYMENT_GATEWAYS)
+    status = models.CharField(max_length=20)
+    count = models.BigIntegerField(default=0)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'gateway', 'status'], name='payment_rollup_cell'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.gateway} {self.status}: {self.count}"
+
+
+class PaymentOutbox(models.Model):
+    """
+    Durable work item for a payment that still has to be sent to its gateway.
+
+    Written in the same transaction as the payment. ``available_at`` doubles as
+    the claim lease: a worker that claims a row pushes it into the future, so
+    rows from a crashed worker become claimable again once the lease expires.
+    """
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='outbox')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Outbox for payment {self.payment_id} (attempt {self.attempts})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a request sent with an ``Idempotency-Key`` header.
+
+    The row is inserted before the request is processed, so its unique key
+    also serves as the lock concurrent duplicates wait on; ``response_status``
+    stays null until the first request has finished.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
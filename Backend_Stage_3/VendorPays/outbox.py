@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dispatch import record_result
+from .gateways import GatewayResult, load_adapters
+from .models import PaymentOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """
+    Claims batches of PaymentOutbox rows and sends them to their gateways.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so any number
+    of workers (threads, processes or hosts) can share the table without
+    handing out the same payment twice. Gateway calls for a batch run
+    concurrently on the worker's own event loop.
+    """
+    def __init__(self, batch_size=100, max_attempts=5, lease_seconds=300,
+                 backoff_base=5.0, backoff_max=600.0, adapters=None):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._adapters = adapters
+        self._loop = None
+
+    @property
+    def adapters(self):
+        if self._adapters is None:
+            self._adapters = load_adapters()
+        return self._adapters
+
+    @property
+    def loop(self):
+        # Adapter pools are bound to the loop they first ran on, so keep one.
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+    def claim_batch(self):
+        now = timezone.now()
+        with transaction.atomic():
+            entries = list(
+                PaymentOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('payment')
+                .filter(available_at__lte=now)
+                .order_by('available_at')[:self.batch_size]
+            )
+            if entries:
+                # Lease the rows; they come back on their own if this worker dies.
+                PaymentOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                    available_at=now + self.lease
+                )
+        return entries
+
+    async def _charge(self, entry):
+        try:
+            return await self.adapters[entry.payment.gateway].process(entry.payment)
+        except Exception as exc:
+            return exc
+
+    async def _charge_batch(self, entries):
+        return await asyncio.gather(*(self._charge(entry) for entry in entries))
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        # Jitter keeps retries from a gateway outage from arriving in lockstep.
+        return timedelta(seconds=random.uniform(delay / 2, delay))
+
+    def run_once(self):
+        """Process one batch. Returns the number of outbox rows handled."""
+        entries = self.claim_batch()
+        if not entries:
+            return 0
+        outcomes = self.loop.run_until_complete(self._charge_batch(entries))
+        for entry, outcome in zip(entries, outcomes):
+            if isinstance(outcome, GatewayResult):
+                self.complete(entry, outcome)
+            else:
+                self.retry(entry, outcome)
+        return len(entries)
+
+    def complete(self, entry, result):
+        with transaction.atomic():
+            record_result(entry.payment_id, result)
+            entry.delete()
+
+    def retry(self, entry, error):
+        attempts = entry.attempts + 1
+        message = str(error) or error.__class__.__name__
+        if attempts >= self.max_attempts:
+            logger.error('Giving up on payment %s after %s attempts: %s',
+                         entry.payment_id, attempts, message)
+            self.complete(entry, GatewayResult(False, message))
+            return
+        logger.warning('Payment %s attempt %s failed, retrying: %s',
+                       entry.payment_id, attempts, message)
+        PaymentOutbox.objects.filter(pk=entry.pk).update(
+            attempts=attempts,
+            available_at=timezone.now() + self.backoff(attempts),
+            last_error=message,
+        )
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PaymentCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key, newest first.
+
+    Every page is an index seek from the cursor position: no OFFSET scan and
+    no COUNT(*), however deep the client pages.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
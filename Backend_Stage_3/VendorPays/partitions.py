@@ -0,0 +1,209 @@
+"""
+Optional monthly range partitioning of the payments table on PostgreSQL.
+
+``partition_table()`` converts the plain table in place: the rows are copied
+into a table partitioned by ``created_at``, with one partition per month plus
+a default partition for anything outside them. Indexes, check and foreign
+key constraints are carried over.
+
+PostgreSQL requires the partition key in every unique constraint, so the
+primary key becomes (id, created_at) and the outbox loses its foreign key to
+payments (Django still cascades deletes). Transaction ids stay unique across
+all partitions: a trigger claims each one in a side table keyed on it.
+"""
+from datetime import date
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, PaymentOutbox
+
+SEQUENCE_SUFFIX = '_part_id_seq'
+TRANSACTION_IDS_SUFFIX = '_transaction_ids'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def table_name():
+    return Payment._meta.db_table
+
+
+def partition_name(month):
+    return f'{table_name()}_p{month:%Y%m}'
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+                       [connection.ops.quote_name(table_name())])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def create_partition(cursor, quote, month):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(partition_name(month))} PARTITION OF {quote(table_name())} '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def ensure_partitions(connection, months_ahead=3):
+    """Create the monthly partitions up to ``months_ahead`` months from now."""
+    if not is_partitioned(connection):
+        return
+    quote = connection.ops.quote_name
+    this_month = month_start(timezone.now())
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            create_partition(cursor, quote, add_months(this_month, offset))
+
+
+def drop_empty_partitions(connection, before):
+    """Drop monthly partitions that end before ``before`` and hold no rows."""
+    if not is_partitioned(connection):
+        return []
+    quote = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s) AND child.relname LIKE %s',
+            [quote(table_name()), f'{table_name()}\\_p%'],
+        )
+        for (name,) in cursor.fetchall():
+            suffix = name.rsplit('_p', 1)[1]
+            month = date(int(suffix[:4]), int(suffix[4:]), 1)
+            if add_months(month, 1) > before:
+                continue
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {quote(name)})')
+            if not cursor.fetchone()[0]:
+                cursor.execute(f'DROP TABLE {quote(name)}')
+                dropped.append(name)
+    return dropped
+
+
+def keep_transaction_ids_unique(cursor, quote, table, legacy):
+    """
+    Create the side table holding every payment's transaction id, kept in
+    step with ``table`` by trigger, before any rows are copied into it. A
+    duplicate transaction id fails its INSERT or UPDATE with a unique violation.
+    """
+    column = quote(Payment._meta.get_field('transaction_id').column)
+    ids = quote(table + TRANSACTION_IDS_SUFFIX)
+    function = quote(f'{table}_claim_transaction_id')
+    cursor.execute(
+        'SELECT format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = %s',
+        [quote(legacy), Payment._meta.get_field('transaction_id').column],
+    )
+    column_type = cursor.fetchone()[0]
+    cursor.execute(f'CREATE TABLE {ids} (transaction_id {column_type} PRIMARY KEY)')
+    cursor.execute(f"""
+        CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                TRUNCATE {ids};
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' AND OLD.{column} IS NOT NULL THEN
+                DELETE FROM {ids} WHERE transaction_id = OLD.{column};
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.{column} IS NOT NULL THEN
+                INSERT INTO {ids} VALUES (NEW.{column});
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute(
+        f'CREATE TRIGGER {quote(table + "_transaction_id")} AFTER INSERT OR UPDATE OF {column} OR DELETE '
+        f'ON {quote(table)} FOR EACH ROW EXECUTE FUNCTION {function}()'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {quote(table + "_truncate_transaction_ids")} AFTER TRUNCATE '
+        f'ON {quote(table)} FOR EACH STATEMENT EXECUTE FUNCTION {function}()'
+    )
+
+
+def partition_table(connection, months_ahead=3):
+    """
+    Convert the payments table to monthly partitions. Returns False if it
+    already was partitioned. Takes an exclusive lock for the copy.
+    """
+    if connection.vendor != 'postgresql':
+        raise ImproperlyConfigured('Payment partitioning needs PostgreSQL.')
+    if is_partitioned(connection):
+        return False
+    quote = connection.ops.quote_name
+    table = table_name()
+    legacy = f'{table}_unpartitioned'
+    sequence = f'{table}{SEQUENCE_SUFFIX}'
+    outbox = PaymentOutbox._meta.db_table
+    transaction_id = Payment._meta.get_field('transaction_id').column
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        # Read the indexes and constraints to recreate while they still name the table.
+        cursor.execute(
+            'SELECT pg_get_indexdef(i.indexrelid), i.indisunique, i.indisprimary, '
+            'ARRAY(SELECT a.attname::text FROM pg_attribute a WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)) '
+            'FROM pg_index i WHERE i.indrelid = to_regclass(%s)',
+            [quote(table)],
+        )
+        indexes = []
+        for definition, unique, primary, columns in cursor.fetchall():
+            if primary or (unique and columns == [transaction_id]):
+                continue
+            if unique:
+                raise ImproperlyConfigured(f'A partitioned payments table can\'t keep this unique index: {definition}')
+            indexes.append(definition)
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype IN ('c', 'f')",
+            [quote(table)],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            'SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND confrelid = to_regclass(%s)',
+            [quote(outbox), quote(table)],
+        )
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {quote(outbox)} DROP CONSTRAINT {quote(constraint)}')
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}')
+
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval('{quote(sequence)}')")
+        cursor.execute(f'ALTER SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id')
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, created_at)')
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+
+        cursor.execute(f'SELECT MIN(created_at) FROM {quote(legacy)}')
+        oldest = cursor.fetchone()[0]
+        month = month_start(oldest) if oldest is not None else month_start(timezone.now())
+        last = add_months(month_start(timezone.now()), months_ahead)
+        while month <= last:
+            create_partition(cursor, quote, month)
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(table)} DEFAULT')
+
+        keep_transaction_ids_unique(cursor, quote, table, legacy)
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}')
+        cursor.execute(f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {quote(table)}', [quote(sequence)])
+        cursor.execute(f'DROP TABLE {quote(legacy)}')
+        # Index names are free again now that the old table is gone.
+        for definition in indexes:
+            cursor.execute(definition)
+    return True
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import archive
+from .models import Payment, PaymentDailyRollup
+
+# Rollup rows per upsert statement, well under the databases' parameter limits.
+ADD_BATCH_SIZE = 1000
+
+
+def cell(payment, status=None):
+    """The (day, gateway, status) rollup a payment is counted in."""
+    return (timezone.localdate(payment.created_at), payment.gateway, status or payment.status)
+
+
+def add(deltas):
+    """
+    Add ``{cell: (count, total)}`` to the rollup rows in one upsert.
+
+    The increment happens in the database (INSERT ... ON CONFLICT DO UPDATE),
+    so concurrent writers never lose each other's updates.
+    """
+    if not deltas:
+        return
+    connection = connections[router.db_for_write(PaymentDailyRollup)]
+    ops = connection.ops
+    qn = ops.quote_name
+    table = qn(PaymentDailyRollup._meta.db_table)
+    day, gateway, status, count, total = (qn(name) for name in ('day', 'gateway', 'status', 'count', 'total'))
+    total_field = PaymentDailyRollup._meta.get_field('total')
+    # Sorted, so concurrent transactions lock rows in the same order.
+    cells = sorted(deltas.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(cells), ADD_BATCH_SIZE):
+            batch = cells[start:start + ADD_BATCH_SIZE]
+            params = []
+            for (cell_day, cell_gateway, cell_status), (cell_count, cell_total) in batch:
+                params += [
+                    ops.adapt_datefield_value(cell_day), cell_gateway, cell_status, cell_count,
+                    ops.adapt_decimalfield_value(cell_total, total_field.max_digits, total_field.decimal_places),
+                ]
+            values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} ({day}, {gateway}, {status}, {count}, {total}) VALUES {values} '
+                f'ON CONFLICT ({day}, {gateway}, {status}) DO UPDATE SET '
+                f'{count} = {table}.{count} + EXCLUDED.{count}, {total} = {table}.{total} + EXCLUDED.{total}',
+                params,
+            )
+
+
+def deltas_for(payments):
+    deltas = defaultdict(lambda: (0, Decimal('0')))
+    for payment in payments:
+        count, total = deltas[cell(payment)]
+        deltas[cell(payment)] = (count + 1, total + Decimal(payment.amount))
+    return dict(deltas)
+
+
+def payments_created(payments):
+    add(deltas_for(payments))
+
+
+def status_changed(payment, old_status, new_status):
+    amount = Decimal(payment.amount)
+    add({
+        cell(payment, old_status): (-1, -amount),
+        cell(payment, new_status): (1, amount),
+    })
+
+
+def rebuild(since=None):
+    """
+    Recompute the rollups from the payments table and the archive, for
+    every day or only from ``since`` on. Returns the number of rollup rows.
+    """
+    payments = Payment.objects.all()
+    rollups = PaymentDailyRollup.objects.all()
+    start = None
+    if since is not None:
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        payments = payments.filter(created_at__gte=start)
+        rollups = rollups.filter(day__gte=since)
+    with transaction.atomic():
+        connection = connections[router.db_for_write(PaymentDailyRollup)]
+        if connection.vendor == 'postgresql':
+            # Payment writes wait for the rebuild to commit, then add their
+            # deltas on top of it instead of being lost or counted twice.
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {connection.ops.quote_name(PaymentDailyRollup._meta.db_table)} '
+                               'IN EXCLUSIVE MODE')
+        rollups.delete()
+        cells = (
+            payments.order_by()
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'gateway', 'status')
+            .annotate(count=Count('id'), total=Sum('amount'))
+        )
+        PaymentDailyRollup.objects.bulk_create(
+            (PaymentDailyRollup(**row) for row in cells.iterator()), batch_size=1000
+        )
+        add(deltas_for(archive.payments(start)))
+        return rollups.count()
+
+
+def report(start, end, gateway=None, status=None):
+    """Rollup rows for the days ``start`` to ``end``; never touches payments."""
+    rows = PaymentDailyRollup.objects.filter(day__range=(start, end), count__gt=0)
+    if gateway is not None:
+        rows = rows.filter(gateway=gateway)
+    if status is not None:
+        rows = rows.filter(status=status)
+    return rows.order_by('day', 'gateway', 'status')
+
+
+def totals(rows):
+    """Sum rollup rows per gateway and status."""
+    sums = defaultdict(lambda: [0, Decimal('0')])
+    for row in rows:
+        sums[(row.gateway, row.status)][0] += row.count
+        sums[(row.gateway, row.status)][1] += row.total
+    return [
+        {'gateway': gateway, 'status': status, 'count': count, 'total': f'{total:.2f}'}
+        for (gateway, status), (count, total) in sorted(sums.items())
+    ]
@@ -6,7 +6,10 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         from rest_framework import serializers
-from .models import Payment
+from datetime import timedelta
+from django.utils import timezone
+from pulse_common import instrumentation
+from .models import Payment, PaymentDailyRollup
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,3 +19,44 @@ class PaymentSerializer(serializers.ModelSerializer):
             'status', 'transaction_id'
         ]
         read_only_fields = ['status', 'transaction_id']
+
+    def to_representation(self, instance):
+        with instrumentation.timer('serializer'):
+            return super().to_representation(instance)
+
+
+class PaymentFilterSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by GET /api/v1/payments/."""
+    status = serializers.CharField(required=False, max_length=20)
+    gateway = serializers.ChoiceField(choices=Payment.PAYMENT_GATEWAYS, required=False)
+    email = serializers.EmailField(required=False)
+    min_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+
+class PaymentSummaryFilterSerializer(serializers.Serializer):
+    """
+    Validates the query parameters accepted by GET /api/v1/payments/summary/.
+    The range defaults to the last 30 days and may span at most a year.
+    """
+    max_days = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    gateway = serializers.ChoiceField(choices=Payment.PAYMENT_GATEWAYS, required=False)
+    status = serializers.CharField(required=False, max_length=20)
+
+    def validate(self, attrs):
+        end = attrs.setdefault('end', timezone.localdate())
+        start = attrs.setdefault('start', end - timedelta(days=29))
+        if start > end:
+            raise serializers.ValidationError({'start': 'Must not be after end.'})
+        if (end - start).days >= self.max_days:
+            raise serializers.ValidationError({'start': f'The range may span at most {self.max_days} days.'})
+        return attrs
+
+
+class PaymentDailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentDailyRollup
+        fields = ['day', 'gateway', 'status', 'count', 'total']
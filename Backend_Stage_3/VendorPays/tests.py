@@ -1,9 +1,41 @@
+import asyncio
+import importlib
+import io
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipIf, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Payment
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from pulse_common import database, instrumentation, routers
+from pulse_common.renderers import ORJSONRenderer
+from . import cache as payment_cache
+from . import idempotency, partitions
+from .dispatch import PaymentDispatcher, record_result
+from .gateways import FakeGatewayAdapter, GatewayAdapter, GatewayError, GatewayResult
+from .models import IdempotencyKey, Payment, PaymentArchive, PaymentDailyRollup, PaymentOutbox
+from .outbox import OutboxWorker
 
 class PaymentAPITests(APITestCase):
+    def setUp(self):
+        # Rolled-back test transactions reuse ids; drop payments cached by earlier tests.
+        cache.clear()
+        payment_cache.local.clear()
+
     def test_create_payment(self):
         # Use the namespaced URL
         url = reverse('payments:payment-list')
@@ -14,10 +46,28 @@ class PaymentAPITests(APITestCase):
             "gateway": "paypal"
         }
         response = self.client.post(url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
         self.assertTrue(response.data['transaction_id'].startswith('PAYPAL-TX-'))
 
+    def test_create_payment_dispatches_after_commit(self):
+        url = reverse('payments:payment-list')
+        data = {"name": "John Doe", "email": "john@example.com", "amount": "100.00"}
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(url, data, format='json')
+        self.assertEqual(len(callbacks), 1)
+
+    def test_create_payment_uses_single_insert(self):
+        url = reverse('payments:payment-list')
+        data = {"name": "John Doe", "email": "john@example.com", "amount": "100.00"}
+        # The payment INSERT plus the upsert of its daily rollup.
+        with self.assertNumQueries(2):
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        payment = Payment.objects.get(pk=response.data['id'])
+        self.assertEqual(payment.transaction_id, response.data['transaction_id'])
+        self.assertTrue(payment.transaction_id.startswith('PAYSTACK-TX-'))
+
     def test_get_payment(self):
         # Create a payment directly in the database.
         payment = Payment.objects.create(
@@ -32,3 +82,583 @@ class PaymentAPITests(APITestCase):
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], "Jane Doe")
+
+    def test_bulk_create_payments(self):
+        url = reverse('payments:payment-bulk')
+        data = [
+            {"name": "Alice", "email": "alice@example.com", "amount": "10.00", "gateway": "paypal"},
+            {"name": "Bob", "email": "bob@example.com", "amount": "20.00", "gateway": "flutterwave"},
+        ]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertTrue(response.data[0]['transaction_id'].startswith('PAYPAL-TX-'))
+        self.assertTrue(response.data[1]['transaction_id'].startswith('FLUTTERWAVE-TX-'))
+        self.assertEqual(response.data[1]['status'], 'pending')
+
+    def test_bulk_create_rejects_invalid_batch(self):
+        url = reverse('payments:payment-bulk')
+        data = [
+            {"name": "Alice", "email": "alice@example.com", "amount": "10.00"},
+            {"name": "Bob", "email": "not-an-email", "amount": "20.00"},
+        ]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('email', response.data[1])
+        self.assertEqual(Payment.objects.count(), 0)
+
+
+class PaymentListTests(APITestCase):
+    def setUp(self):
+        rows = [
+            ("a@example.com", "10.00", "paypal", "completed"),
+            ("a@example.com", "25.00", "paystack", "pending"),
+            ("b@example.com", "40.00", "paypal", "completed"),
+            ("c@example.com", "90.00", "paypal", "failed"),
+        ]
+        for index, (email, amount, gateway, payment_status) in enumerate(rows):
+            Payment.objects.create(
+                email=email, amount=amount, gateway=gateway, status=payment_status,
+                transaction_id=f"{gateway.upper()}-TX-{index}",
+            )
+
+    def list_payments(self, **params):
+        return self.client.get(reverse('payments:payment-list'), params)
+
+    def test_list_filters_by_status_and_gateway(self):
+        response = self.list_payments(status='completed', gateway='paypal')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['email'] for p in response.data['results']], ["b@example.com", "a@example.com"])
+
+    def test_list_filters_by_email_and_amount_range(self):
+        response = self.list_payments(email='a@example.com', min_amount='20')
+        self.assertEqual([p['amount'] for p in response.data['results']], ["25.00"])
+        response = self.list_payments(min_amount='20', max_amount='50')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_paginates_with_cursor(self):
+        response = self.list_payments(page_size=3)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_rejects_invalid_filters(self):
+        response = self.list_payments(gateway='stripe')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('gateway', response.data)
+
+class PaymentDispatchTests(APITransactionTestCase):
+    # The dispatcher queries from executor threads, which only see committed rows.
+    def create_pending_payment(self, gateway='paypal'):
+        return Payment.objects.create(
+            name="Jane Doe",
+            email="jane@example.com",
+            amount="50.00",
+            gateway=gateway,
+            transaction_id=f"{gateway.upper()}-TX-1",
+        )
+
+    def test_dispatch_completes_payment(self):
+        payment = self.create_pending_payment()
+        dispatcher = PaymentDispatcher({'paypal': FakeGatewayAdapter('paypal')})
+        result = async_to_sync(dispatcher.dispatch)(payment.id)
+        self.assertTrue(result.success)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+    def test_dispatch_marks_declined_payment_failed(self):
+        payment = self.create_pending_payment('paystack')
+        dispatcher = PaymentDispatcher({'paystack': FakeGatewayAdapter('paystack', failure_rate=1.0)})
+        async_to_sync(dispatcher.dispatch)(payment.id)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+
+    def test_gateway_pool_limits_concurrency(self):
+        class TrackingAdapter(FakeGatewayAdapter):
+            in_flight = peak = 0
+
+            async def charge(self, connection, payment):
+                TrackingAdapter.in_flight += 1
+                TrackingAdapter.peak = max(TrackingAdapter.peak, TrackingAdapter.in_flight)
+                try:
+                    return await super().charge(connection, payment)
+                finally:
+                    TrackingAdapter.in_flight -= 1
+
+        async def run():
+            adapter = TrackingAdapter('paypal', latency=0.01, max_concurrency=2)
+            return await asyncio.gather(*(adapter.process(None) for _ in range(6)))
+
+        results = async_to_sync(run)()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(TrackingAdapter.peak, 2)
+
+    def test_adapters_must_implement_charge(self):
+        class IncompleteAdapter(GatewayAdapter):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteAdapter('paypal')
+
+
+class FailingGatewayAdapter(FakeGatewayAdapter):
+    async def charge(self, connection, payment):
+        raise GatewayError('gateway unavailable')
+
+
+@override_settings(PAYMENT_DISPATCH_MODE='outbox')
+class PaymentOutboxTests(APITestCase):
+    def create_payment(self):
+        url = reverse('payments:payment-list')
+        data = {"name": "John Doe", "email": "john@example.com", "amount": "100.00", "gateway": "paypal"}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return Payment.objects.get(pk=response.data['id'])
+
+    def test_create_payment_enqueues_outbox_entry(self):
+        payment = self.create_payment()
+        self.assertEqual(payment.status, 'pending')
+        self.assertTrue(PaymentOutbox.objects.filter(payment=payment).exists())
+
+    def test_worker_processes_outbox(self):
+        payment = self.create_payment()
+        worker = OutboxWorker(adapters={'paypal': FakeGatewayAdapter('paypal')})
+        self.assertEqual(worker.run_once(), 1)
+        worker.close()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertFalse(PaymentOutbox.objects.exists())
+
+    def test_worker_retries_with_backoff_then_gives_up(self):
+        payment = self.create_payment()
+        worker = OutboxWorker(max_attempts=2, adapters={'paypal': FailingGatewayAdapter('paypal')})
+        worker.run_once()
+        entry = PaymentOutbox.objects.get(payment=payment)
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.available_at, timezone.now())
+        self.assertEqual(entry.last_error, 'gateway unavailable')
+        # Nothing is claimable until the backoff expires.
+        self.assertEqual(worker.run_once(), 0)
+
+        PaymentOutbox.objects.update(available_at=timezone.now())
+        worker.run_once()
+        worker.close()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertFalse(PaymentOutbox.objects.exists())
+
+    def test_process_payments_command(self):
+        payment = self.create_payment()
+        call_command('process_payments', '--once', '--processes', '1', stdout=io.StringIO())
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+
+class IdempotencyTests(APITestCase):
+    url = reverse('payments:payment-list')
+    data = {"name": "John Doe", "email": "john@example.com", "amount": "100.00", "gateway": "paypal"}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_retry_replays_first_response(self):
+        first = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        second = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_replay_falls_back_to_database(self):
+        first = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-2')
+        cache.clear()
+        second = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-2')
+        self.assertEqual(second.data['transaction_id'], first.data['transaction_id'])
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-3')
+        other = dict(self.data, amount="5.00")
+        response = self.client.post(self.url, other, format='json', HTTP_IDEMPOTENCY_KEY='retry-3')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0)
+    def test_duplicate_of_in_flight_request_conflicts(self):
+        IdempotencyKey.objects.create(
+            key='retry-4', fingerprint='in-flight', expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        response = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-4')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Payment.objects.count(), 0)
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0, IDEMPOTENCY_LEASE=0)
+    def test_key_of_request_that_died_is_reclaimed_after_lease(self):
+        # Claimed by a worker that was killed before storing a response.
+        stale = idempotency._claim('retry-5', 'dead-worker')
+        self.assertLessEqual(stale.expires_at, timezone.now())
+        response = self.client.post(self.url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='retry-5')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        record = IdempotencyKey.objects.get(key='retry-5')
+        self.assertEqual(record.response_status, status.HTTP_202_ACCEPTED)
+        self.assertGreater(record.expires_at, timezone.now() + timedelta(hours=23))
+
+
+class RendererTests(APITestCase):
+    def test_orjson_renderer_output_matches_default_renderer(self):
+        url = reverse('payments:payment-list')
+        data = {"name": "Zo\u00eb", "email": "zoe@example.com", "amount": "12.50", "gateway": "paystack"}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertEqual(response.json()['name'], "Zo\u00eb")
+        self.assertEqual(ORJSONRenderer().render({'amount': Decimal('12.50')}), b'{"amount":12.5}')
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0)
+class PerformanceMiddlewareTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.registry = instrumentation.MetricsRegistry('web-1')
+
+    def test_server_timing_and_metrics(self):
+        url = reverse('payments:payment-list')
+        data = {"name": "Jane", "email": "jane@example.com", "amount": "10.00", "gateway": "paypal"}
+        response = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='perf-1')
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'serializer', 'render', 'cache', 'total'})
+        self.assertNotIn('"0 queries"', timing['db'])
+        self.assertEqual(timing['cache'], 'desc="hit=0 miss=1"')
+
+        self.client.get(url)
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        labels = 'route="payments:payment-list",method="POST",worker="web-1"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', metrics)
+        labels = 'route="payments:payment-list",method="GET",worker="web-1"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', metrics)
+        self.assertIn('http_request_sampled_requests_total{route="payments:payment-list",worker="web-1"} 2', metrics)
+
+    def test_metrics_cover_every_worker(self):
+        # Another gunicorn worker sharing the cache.
+        other = instrumentation.MetricsRegistry('web-2')
+        other.observe('payments:payment-list', 'GET', 0.01)
+        other.publish()
+        self.client.get(reverse('payments:payment-list'))
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        for worker in ('web-1', 'web-2'):
+            labels = f'route="payments:payment-list",method="GET",worker="{worker}"'
+            self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', metrics)
+
+        # Workers that stopped publishing drop out.
+        cache.delete(instrumentation.worker_key('web-2'))
+        self.assertNotIn('worker="web-2"', self.client.get(reverse('metrics')).content.decode())
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_only_timed(self):
+        response = self.client.get(reverse('payments:payment-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('route="payments:payment-list"', instrumentation.registry.render())
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    @mock.patch.dict(os.environ, {
+        'DATABASE_URL': 'postgres://app:secret@db:5432/payments',
+        'DB_CONN_MAX_AGE': 'none',
+        'DB_CONN_HEALTH_CHECKS': 'false',
+        'DB_STATEMENT_TIMEOUT': '2000',
+    })
+    def test_persistent_connections_and_timeouts(self):
+        config = database.default_database('PulseDB')
+        self.assertEqual(config['NAME'], 'payments')
+        self.assertIsNone(config['CONN_MAX_AGE'])
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['OPTIONS']['options'], '-c statement_timeout=2000')
+
+    @mock.patch.dict(os.environ, {
+        'DATABASE_URL': 'postgres://app:secret@db:5432/payments',
+        'DB_POOL': 'true',
+        'DB_MAX_CONNECTIONS': '30',
+        'WEB_CONCURRENCY': '3',
+        'GUNICORN_CMD_ARGS': '--worker-class gthread --threads 16',
+    })
+    def test_pool_is_sized_per_worker(self):
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            with self.assertRaises(ImproperlyConfigured):
+                database.default_database('PulseDB')
+            return
+        config = database.default_database('PulseDB')
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 10)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        # Within the budget, one connection per thread.
+        with mock.patch.dict(os.environ, {'DB_MAX_CONNECTIONS': '100'}):
+            self.assertEqual(database.default_database('PulseDB')['OPTIONS']['pool']['max_size'], 16)
+        with mock.patch.dict(os.environ, {'WEB_THREADS': '8'}):
+            self.assertEqual(database.default_database('PulseDB')['OPTIONS']['pool']['max_size'], 8)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_go_to_replicas_and_writes_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Payment), 'replica1')
+        self.assertEqual(self.router.db_for_write(Payment), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'VendorPays'))
+        with routers.primary():
+            self.assertEqual(self.router.db_for_read(Payment), 'default')
+
+    def test_client_reads_its_own_writes(self):
+        def view(request):
+            if request.method == 'POST':
+                self.router.db_for_write(Payment)
+            return HttpResponse(self.router.db_for_read(Payment))
+
+        middleware = routers.PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+        self.assertEqual(middleware(factory.post('/')).content, b'default')
+        self.assertEqual(middleware(factory.get('/')).content, b'default')
+        self.assertEqual(middleware(factory.get('/', REMOTE_ADDR='10.0.0.9')).content, b'replica1')
+
+
+class PaymentRollupTests(APITestCase):
+    def create_payments(self):
+        url = reverse('payments:payment-list')
+        first = self.client.post(url, {"amount": "100.00", "gateway": "paypal"}, format='json').data
+        self.client.post(reverse('payments:payment-bulk'), [
+            {"amount": "20.50", "gateway": "paypal"},
+            {"amount": "5.00", "gateway": "paystack"},
+        ], format='json')
+        record_result(first['id'], GatewayResult(True))
+        return first
+
+    def summary(self, **params):
+        response = self.client.get(reverse('payments:payment-summary'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_summary_follows_creates_and_status_changes(self):
+        self.create_payments()
+        today = str(timezone.localdate())
+        with self.assertNumQueries(1):
+            data = self.summary()
+        self.assertEqual([dict(row) for row in data['results']], [
+            {'day': today, 'gateway': 'paypal', 'status': 'completed', 'count': 1, 'total': '100.00'},
+            {'day': today, 'gateway': 'paypal', 'status': 'pending', 'count': 1, 'total': '20.50'},
+            {'day': today, 'gateway': 'paystack', 'status': 'pending', 'count': 1, 'total': '5.00'},
+        ])
+        self.assertEqual(self.summary(gateway='paystack')['totals'], [
+            {'gateway': 'paystack', 'status': 'pending', 'count': 1, 'total': '5.00'},
+        ])
+
+    def test_summary_rejects_invalid_range(self):
+        response = self.client.get(reverse('payments:payment-summary'), {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('payments:payment-summary'), {'start': '2020-01-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        self.create_payments()
+        Payment.objects.create(amount='7.00', gateway='flutterwave', status='failed',
+                               created_at=timezone.now() - timedelta(days=3))
+        incremental = self.summary()['results']
+        out = io.StringIO()
+        call_command('rebuild_payment_rollups', stdout=out)
+        self.assertIn('Rebuilt 4 rollup rows', out.getvalue())
+        self.assertEqual(PaymentDailyRollup.objects.count(), 4)
+        rebuilt = self.summary()['results']
+        self.assertEqual(len(rebuilt), 4)
+        self.assertEqual(rebuilt[0]['gateway'], 'flutterwave')
+        self.assertEqual(rebuilt[1:], incremental)
+
+
+    def test_migration_backfills_created_at_where_known(self):
+        migration = importlib.import_module('VendorPays.migrations.0006_payment_rollups')
+        url = reverse('payments:payment-list')
+        single = self.client.post(url, {"amount": "1.00", "gateway": "paypal"}, format='json',
+                                  HTTP_IDEMPOTENCY_KEY='single').data
+        bulk = self.client.post(reverse('payments:payment-bulk'), [{"amount": "2.00", "gateway": "paypal"}],
+                                format='json', HTTP_IDEMPOTENCY_KEY='bulk').data
+        queued = Payment.objects.create(amount='3.00', gateway='paypal')
+        PaymentOutbox.objects.create(payment=queued)
+        unknown = Payment.objects.create(amount='4.00', gateway='paypal')
+        week_ago, two_days_ago = timezone.now() - timedelta(days=7), timezone.now() - timedelta(days=2)
+        IdempotencyKey.objects.update(created_at=week_ago)
+        PaymentOutbox.objects.update(created_at=two_days_ago)
+        migration_time = timezone.now()
+        Payment.objects.update(created_at=migration_time)
+
+        migration.backfill_created_at(apps, mock.Mock(connection=connection))
+        created = dict(Payment.objects.values_list('pk', 'created_at'))
+        self.assertEqual(created[single['id']], week_ago)
+        self.assertEqual(created[bulk[0]['id']], week_ago)
+        self.assertEqual(created[queued.pk], two_days_ago)
+        self.assertEqual(created[unknown.pk], migration_time)
+
+
+class PaymentArchiveTests(APITestCase):
+    def create_payment(self, days_ago, status='completed', amount='10.00'):
+        return Payment.objects.create(amount=amount, gateway='paypal', status=status,
+                                      created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_archive_moves_old_completed_payments(self):
+        old = [self.create_payment(120, amount=f'{n}.00') for n in range(1, 4)]
+        pending = self.create_payment(120, status='pending')
+        recent = self.create_payment(1)
+        out = io.StringIO()
+        call_command('archive_payments', '--older-than-days', '90', '--chunk-size', '2', stdout=out)
+        self.assertIn('Archived 3 payments', out.getvalue())
+        self.assertEqual(set(Payment.objects.values_list('id', flat=True)), {pending.id, recent.id})
+        self.assertEqual(PaymentArchive.objects.count(), 2)
+
+        # Archived payments are still retrievable by id.
+        response = self.client.get(reverse('payments:payment-detail', args=[old[2].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['amount'], '3.00')
+        self.assertEqual(response.data['status'], 'completed')
+        response = self.client.get(reverse('payments:payment-detail', args=[recent.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Rebuilt rollups still count what was archived.
+        call_command('rebuild_payment_rollups', stdout=io.StringIO())
+        day = timezone.localdate(old[0].created_at)
+        rollup = PaymentDailyRollup.objects.get(day=day, status='completed')
+        self.assertEqual((rollup.count, rollup.total), (3, Decimal('6.00')))
+
+    @skipIf(connection.vendor == 'postgresql', 'Partitioning works on PostgreSQL.')
+    def test_partitioning_needs_postgres(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_payments', stdout=io.StringIO())
+        with self.assertRaises(ImproperlyConfigured):
+            partitions.partition_table(connection)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL.')
+class PaymentPartitionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        payment_cache.local.clear()
+
+    def test_partitioned_payments(self):
+        existing = Payment.objects.create(amount='5.00', gateway='paypal', transaction_id='PAYPAL-TX-P1')
+        call_command('partition_payments', stdout=io.StringIO())
+        self.assertTrue(partitions.is_partitioned(connection))
+        self.assertFalse(partitions.partition_table(connection))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, partitions.table_name())
+        self.assertIn('payment_email_idx', constraints)
+        self.assertIn('payment_status_created_idx', constraints)
+
+        old_month = partitions.month_start(timezone.now() - timedelta(days=400))
+        with connection.cursor() as cursor:
+            partitions.create_partition(cursor, connection.ops.quote_name, old_month)
+        old = Payment.objects.create(amount='10.00', gateway='paypal', status='completed',
+                                     transaction_id='PAYPAL-TX-P2', created_at=timezone.now() - timedelta(days=400))
+        self.assertGreater(old.id, existing.id)
+        # Transaction ids stay unique across partitions.
+        for created_at in (old.created_at, timezone.now()):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Payment.objects.create(amount='1.00', gateway='paypal', transaction_id='PAYPAL-TX-P1',
+                                       created_at=created_at)
+        existing.transaction_id = 'PAYPAL-TX-P3'
+        existing.save()
+        Payment.objects.create(amount='1.00', gateway='paypal', transaction_id='PAYPAL-TX-P1')
+
+        response = self.client.get(reverse('payments:payment-detail', args=[existing.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['transaction_id'], 'PAYPAL-TX-P3')
+
+        out = io.StringIO()
+        call_command('archive_payments', '--older-than-days', '90', stdout=out)
+        self.assertIn('Archived 1 payments', out.getvalue())
+        self.assertIn(f'Dropped empty partition {partitions.partition_name(old_month)}', out.getvalue())
+        response = self.client.get(reverse('payments:payment-detail', args=[old.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['transaction_id'], 'PAYPAL-TX-P2')
+
+
+class PaymentCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        payment_cache.local.clear()
+        self.payment = Payment.objects.create(amount='25.00', gateway='paypal', transaction_id='PAYPAL-TX-C1')
+        self.url = reverse('payments:payment-detail', args=[self.payment.id])
+
+    def test_polls_are_served_from_cache_with_etags(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_status_change_refreshes_cached_payment(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            record_result(self.payment.id, GatewayResult(True))
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_long_poll_returns_once_status_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        self.payment.status = 'failed'
+        threading.Timer(0.2, payment_cache.payment_changed, [self.payment]).start()
+        started = time.monotonic()
+        response = self.client.get(self.url, {'wait': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(response.data['status'], 'failed')
+
+        # Nothing left to wait for: a final status answers at once.
+        response = self.client.get(self.url, {'wait': 10}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, {'wait': 'soon'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_long_poll_is_capped(self):
+        with mock.patch.object(payment_cache, 'wait_for_change', return_value=None) as wait_for_change:
+            self.client.get(self.url, {'wait': 600})
+        self.assertEqual(wait_for_change.call_args[0][2], 5)
+
+    @override_settings(PAYMENT_CACHE_LOCAL_TTL=0.05)
+    def test_pending_payments_stay_in_a_shared_cache(self):
+        with mock.patch.object(payment_cache, 'cache_is_shared', return_value=True):
+            self.client.get(self.url)
+            time.sleep(0.1)
+            # Only the local copy expired; the shared tier still answers.
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+            self.assertEqual(response['X-Cache'], 'HIT')
+            with self.captureOnCommitCallbacks(execute=True):
+                record_result(self.payment.id, GatewayResult(True))
+            time.sleep(0.1)
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+            self.assertEqual(response.data['status'], 'completed')
+
+    def test_status_changed_by_another_process_is_picked_up(self):
+        # As if an outbox worker with its own cache had settled the payment.
+        etag = self.client.get(self.url)['ETag']
+        Payment.objects.filter(pk=self.payment.pk).update(status='completed')
+        started = time.monotonic()
+        response = self.client.get(self.url, {'wait': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'completed')
+        # Settled payments stay cached.
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['status'], 'completed')
@@ -1,37 +1,149 @@
+from django.db import transaction
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Payment
-from .serializers import PaymentSerializer
+from . import archive, rollups
+from . import cache as payment_cache
+from .dispatch import dispatch_payments
+from .idempotency import idempotent
+from .models import Payment, generate_transaction_id
+from .pagination import PaymentCursorPagination
+from .serializers import (
+    PaymentDailyRollupSerializer,
+    PaymentFilterSerializer,
+    PaymentSerializer,
+    PaymentSummaryFilterSerializer,
+)
 
 class PaymentViewSet(viewsets.GenericViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = PaymentCursorPagination
+    # Upper bound on items accepted by the bulk endpoint, and rows per INSERT.
+    bulk_max_items = 10000
+    bulk_batch_size = 1000
+    # Longest long-poll accepted by retrieve(?wait=), in seconds. A waiting
+    # request holds one of its worker's threads, so keep it short.
+    max_wait = 5
 
     def get_object(self, pk):
         try:
             return Payment.objects.get(pk=pk)
         except Payment.DoesNotExist:
-            return None
+            # Old completed payments may have been moved to the archive.
+            return archive.find(pk)
+
+    def fresh_entry(self, pk):
+        """Cache the payment as stored in the database; None if there is none."""
+        payment = self.get_object(pk)
+        return payment_cache.load_entry(payment) if payment else None
+
+    def build_payment(self, attrs):
+        """Prepare an unsaved Payment with its transaction id already allocated."""
+        payment = Payment(**attrs)
+        payment.status = 'pending'
+        payment.transaction_id = generate_transaction_id(payment.gateway)
+        return payment
+
+    def filter_queryset(self, queryset):
+        filters = PaymentFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+        lookups = {
+            'status': params.get('status'),
+            'gateway': params.get('gateway'),
+            'email': params.get('email'),
+            'amount__gte': params.get('min_amount'),
+            'amount__lte': params.get('max_amount'),
+        }
+        return queryset.filter(**{key: value for key, value in lookups.items() if value is not None})
+
+    # GET /api/v1/payments/
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(PaymentSerializer(page, many=True).data)
 
     # POST /api/v1/payments/
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            payment = serializer.save()
-            gateway = payment.gateway
+            # A single INSERT: nothing is derived from the autoincrement id.
+            payment = self.build_payment(serializer.validated_data)
+            with transaction.atomic(savepoint=False):
+                payment.save()
+                rollups.payments_created([payment])
+                # The gateway call happens in the background; clients poll retrieve().
+                dispatch_payments([payment])
+            data = PaymentSerializer(payment).data
+            # Committed: pollers of the new payment start from a warm cache.
+            payment_cache.load_entry(payment, data)
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            # Simulate payment processing:
-            # Replace this with actual API calls to your chosen gateway.
-            payment.status = 'completed'
-            payment.transaction_id = f'{gateway.upper()}-TX-{payment.id}'
-            payment.save()
+    # POST /api/v1/payments/bulk/
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    @idempotent
+    def bulk(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False, max_length=self.bulk_max_items
+        )
+        if not serializer.is_valid():
+            # One entry per submitted item ({} for valid ones), nothing is written.
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(PaymentSerializer(payment).data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        payments = [self.build_payment(attrs) for attrs in serializer.validated_data]
+        with transaction.atomic():
+            Payment.objects.bulk_create(payments, batch_size=self.bulk_batch_size)
+            rollups.payments_created(payments)
+            dispatch_payments(payments)
+
+        return Response(PaymentSerializer(payments, many=True).data, status=status.HTTP_202_ACCEPTED)
+
+    # GET /api/v1/payments/summary/
+    @action(detail=False, methods=['get'], url_path='summary', url_name='summary')
+    def summary(self, request, *args, **kwargs):
+        """Payment counts and totals per day, gateway and status, read from the daily rollups."""
+        filters = PaymentSummaryFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+        rows = list(rollups.report(**params))
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'results': PaymentDailyRollupSerializer(rows, many=True).data,
+            'totals': rollups.totals(rows),
+        }, status=status.HTTP_200_OK)
 
     # GET /api/v1/payments/{id}/
     def retrieve(self, request, pk=None, *args, **kwargs):
-        payment = self.get_object(pk)
-        if not payment:
+        """
+        Served from the payment cache. With ?wait=N (seconds) a pending
+        payment is held for up to N seconds until its status changes; pair
+        it with If-None-Match to get 304 if nothing changed.
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
             return Response({'detail': 'Payment not found.'}, status=status.HTTP_404_NOT_FOUND)
-        return Response(PaymentSerializer(payment).data, status=status.HTTP_200_OK)
\ No newline at end of file
+        try:
+            wait = min(max(int(request.query_params.get('wait', 0)), 0), self.max_wait)
+        except ValueError:
+            return Response({'wait': ['A whole number of seconds is required.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        entry = payment_cache.get_entry(pk)
+        hit = entry is not None
+        if entry is None:
+            entry = self.fresh_entry(pk)
+            if entry is None:
+                return Response({'detail': 'Payment not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        if wait and entry['status'] == 'pending':
+            # Only wait if the client has no newer state to learn about already.
+            known = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',') if tag.strip()]
+            if not known or entry['etag'] in known:
+                entry = payment_cache.wait_for_change(
+                    pk, entry, wait, lambda: self.fresh_entry(pk)) or entry
+        return payment_cache.entry_response(request, entry, hit)
\ No newline at end of file
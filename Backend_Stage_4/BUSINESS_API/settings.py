@@ -1,6 +1,6 @@
 from pathlib import Path
 import os
-import dj_database_url
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -9,6 +9,10 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# pulse_common, the code both services share, sits next to the project.
+sys.path.append(str(BASE_DIR.parent))
+from pulse_common import database  # noqa: E402
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -40,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware too.
+    'pulse_common.instrumentation.PerformanceMiddleware',
+    'pulse_common.routers.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -80,23 +87,18 @@ WSGI_APPLICATION = 'BUSINESS_API.wsgi.application'
 #         'NAME': BASE_DIR / 'db.sqlite3',
 #     }
 # }
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Connection reuse, pooling and timeouts are set through DB_* environment
+# variables; see pulse_common/database.py.
+DATABASES = {
+    "default": database.default_database("pulse4DB"),
+    **database.replica_databases(),
+}
 
-if DATABASE_URL:
-    DATABASES = {
-        "default": dj_database_url.config(default=DATABASE_URL)
-    }
-else:
-    DATABASES = {
-        "default": {
-            "ENGINE": "django.db.backends.postgresql",
-            "NAME": os.getenv("DB_NAME", "pulse4DB"),
-            "USER": os.getenv("DB_USER", "postgres"),
-            "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
-            "HOST": os.getenv("DB_HOST", "localhost"),
-            "PORT": os.getenv("DB_PORT", "5432"),
-        }
-    }
+# Safe reads go to the replicas (if any). A client that wrote reads from the
+# primary for DATABASE_REPLICA_PIN_SECONDS so it always sees its own writes.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["pulse_common.routers.ReplicaRouter"]
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", "5"))
 
 # Optional: ensure test database name is set properly when running tests
 import sys
@@ -152,19 +154,59 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',  # throttle for anonymous users
+        # Per-IP throttle for anonymous users; 'products.throttling.TokenBucketRateThrottle'
+        # is a drop-in alternative that smooths bursts instead of counting per window.
+        'products.throttling.SlidingWindowRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/min',  # allow 100 requests per minute per IP
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # orjson-backed JSON; both fall back to the stdlib json versions without orjson.
+    'DEFAULT_RENDERER_CLASSES': [
+        'pulse_common.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'pulse_common.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Throttle counters and cached responses must be shared by every gunicorn
+# worker and host, so production points REDIS_URL at a shared Redis.
+# Without it (local runs, tests) each process gets its own in-memory cache.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 SWAGGER_USE_COMPAT_RENDERERS = False
 
+# Seconds a cached product list/detail response may be served; writes
+# invalidate them immediately by bumping the catalog version.
+PRODUCT_CACHE_TIMEOUT = int(os.getenv("PRODUCT_CACHE_TIMEOUT", 300))
+
+# Seconds the change feed holds back recent changes, so transactions that
+# commit late are not skipped. Keep it above the longest product write.
+PRODUCT_CHANGES_LAG = int(os.getenv("PRODUCT_CHANGES_LAG", 5))
+
+# Fraction of requests broken down into DB/throttle/serializer/render time in a
+# Server-Timing header and the /metrics counters. Every request is still timed.
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.1"))
+
+# Seconds between a worker's metrics snapshots in the shared cache; /metrics
+# reports every worker's, each with a worker label.
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
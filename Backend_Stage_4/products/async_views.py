@@ -0,0 +1,64 @@
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .mixins import AsyncRateLimitMixin
+from .models import Product
+from .serializers import ProductFilterSerializer, ProductRowSerializer
+
+# Async (ASGI) versions of the read endpoints. They hold no thread while
+# waiting on the database or a slow client, so one uvicorn worker can serve
+# thousands of concurrent connections. Responses match the DRF views.
+
+
+class ProductListAsyncView(AsyncRateLimitMixin, View):
+    page_size = api_settings.PAGE_SIZE or 10
+    page_query_param = 'page'
+
+    def page_link(self, request, page, last_page):
+        if page < 1 or page > last_page:
+            return None
+        url = request.build_absolute_uri()
+        if page == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page)
+
+    async def get(self, request, *args, **kwargs):
+        filters = ProductFilterSerializer(data=request.GET)
+        if not filters.is_valid():
+            return self.respond({"error": filters.errors}, status.HTTP_400_BAD_REQUEST)
+        try:
+            fields = ProductRowSerializer.parse_fields(request.GET.get('fields'))
+        except ValidationError as e:
+            return self.respond({"error": e.detail}, status.HTTP_400_BAD_REQUEST)
+
+        queryset = filters.filter(Product.objects.order_by('id'))
+        count = await queryset.acount()
+        last_page = max((count + self.page_size - 1) // self.page_size, 1)
+        try:
+            page = int(request.GET.get(self.page_query_param, 1))
+        except ValueError:
+            page = 0
+        if not 1 <= page <= last_page:
+            return self.respond({"detail": "Invalid page."}, status.HTTP_404_NOT_FOUND)
+
+        offset = (page - 1) * self.page_size
+        rows = [row async for row in queryset.values(*fields)[offset:offset + self.page_size]]
+        return self.respond({
+            "count": count,
+            "next": self.page_link(request, page + 1, last_page),
+            "previous": self.page_link(request, page - 1, last_page),
+            "results": ProductRowSerializer(fields).to_representation(rows),
+        })
+
+
+class ProductDetailAsyncView(AsyncRateLimitMixin, View):
+    async def get(self, request, id, *args, **kwargs):
+        fields = ProductRowSerializer.all_fields
+        try:
+            row = await Product.objects.values(*fields).aget(id=id)
+        except Product.DoesNotExist:
+            return self.respond({"error": "Product not found."}, status.HTTP_404_NOT_FOUND)
+        return self.respond(ProductRowSerializer(fields).to_representation([row])[0])
@@ -0,0 +1,76 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from pulse_common import instrumentation, routers
+
+CATALOG_VERSION_KEY = 'products:catalog-version'
+CATALOG_WRITTEN_KEY = 'products:catalog-written'
+
+
+def get_timeout():
+    return getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 300)
+
+
+def catalog_version():
+    """Current catalog version; part of every cached response key."""
+    if not routers.replicas():
+        return cache.get_or_set(CATALOG_VERSION_KEY, 1, None)
+    values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_WRITTEN_KEY])
+    if CATALOG_WRITTEN_KEY in values:
+        # Replicas may not have the latest write yet; don't cache their rows.
+        routers.pin_primary()
+    return values.get(CATALOG_VERSION_KEY) or cache.get_or_set(CATALOG_VERSION_KEY, 1, None)
+
+
+def product_changed():
+    """
+    Invalidate cached catalog responses after any product write.
+
+    Bumping the version makes every previously cached key unreachable, so
+    nothing has to be deleted and a reader can never resurrect a stale entry.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # No version yet (or it was evicted): start from a fresh one.
+        cache.add(CATALOG_VERSION_KEY, 2, None)
+    if routers.replicas():
+        cache.set(CATALOG_WRITTEN_KEY, 1, getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5))
+
+
+def response_cache_key(request):
+    """Key for a GET response: catalog version plus the full absolute URL."""
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f'products:response:{catalog_version()}:{url}'
+
+
+def make_entry(data):
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    # Weak: the envelope around this data (rate-limit headers) differs per request.
+    return {'data': data, 'etag': f'W/"{hashlib.md5(body).hexdigest()}"'}
+
+
+def get_entry(key):
+    return cache.get(key)
+
+
+def set_entry(key, data, timeout=None):
+    entry = make_entry(data)
+    cache.set(key, entry, get_timeout() if timeout is None else timeout)
+    return entry
+
+
+def entry_response(request, entry, hit):
+    """Build the response for a cached entry, honouring If-None-Match."""
+    instrumentation.record_cache(hit)
+    headers = {'ETag': entry['etag'], 'X-Cache': 'HIT' if hit else 'MISS'}
+    if_none_match = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+    if entry['etag'] in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entry['data'], status=status.HTTP_200_OK, headers=headers)
@@ -0,0 +1,121 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Product, ProductTombstone
+from .serializers import ProductSerializer
+
+UPDATED = 0
+DELETED = 1
+
+
+class ProductChangeFeed:
+    """
+    Products changed or deleted after a cursor, oldest change first.
+
+    Changed products are read in (updated_at, id) order and tombstones in
+    (deleted_at, id) order, both straight off their indexes, and the two
+    streams are merged. A cursor is the (timestamp, kind, id) of the last
+    change returned, so a product updated several times shows up once, at its
+    latest position, and pages never overlap or skip.
+
+    Timestamps are taken when a row is written, not when its transaction
+    commits, so a slow transaction can commit a change older than one already
+    returned. Changes younger than PRODUCT_CHANGES_LAG seconds are therefore
+    held back and no cursor ever points inside that window: a transaction
+    that commits within the lag is still delivered.
+    """
+    since_query_param = 'since'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+
+    def __init__(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position = self.decode_cursor(request.query_params.get(self.since_query_param))
+        self.horizon = timezone.now() - timedelta(seconds=self.get_lag())
+
+    @staticmethod
+    def get_lag():
+        return getattr(settings, 'PRODUCT_CHANGES_LAG', 5)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, position):
+        changed_at, kind, pk = position
+        payload = json.dumps([changed_at.isoformat(), kind, pk]).encode()
+        return urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            changed_at, kind, pk = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            if kind not in (UPDATED, DELETED):
+                raise ValueError
+            return datetime.fromisoformat(changed_at), kind, int(pk)
+        except (ValueError, TypeError):
+            raise ValidationError({self.since_query_param: ['Invalid cursor.']})
+
+    def updated_products(self):
+        queryset = Product.objects.filter(updated_at__lte=self.horizon).order_by('updated_at', 'id')
+        if self.position is not None:
+            changed_at, kind, pk = self.position
+            after = Q(updated_at__gt=changed_at)
+            if kind == UPDATED:
+                after |= Q(updated_at=changed_at, id__gt=pk)
+            # The plain >= bound keeps this a range scan on the (updated_at, id) index.
+            queryset = queryset.filter(updated_at__gte=changed_at).filter(after)
+        return [((product.updated_at, UPDATED, product.id), product)
+                for product in queryset[:self.page_size + 1]]
+
+    def deleted_products(self):
+        queryset = ProductTombstone.objects.filter(deleted_at__lte=self.horizon).order_by('deleted_at', 'id')
+        if self.position is not None:
+            changed_at, kind, pk = self.position
+            if kind == UPDATED:
+                queryset = queryset.filter(deleted_at__gte=changed_at)
+            else:
+                queryset = queryset.filter(deleted_at__gte=changed_at).filter(
+                    Q(deleted_at__gt=changed_at) | Q(id__gt=pk)
+                )
+        return [((tombstone.deleted_at, DELETED, tombstone.id), tombstone)
+                for tombstone in queryset[:self.page_size + 1]]
+
+    def represent(self, position, item):
+        changed_at = position[0]
+        if position[1] == UPDATED:
+            return {
+                'type': 'updated',
+                'id': item.id,
+                'changed_at': changed_at,
+                'product': ProductSerializer(item).data,
+            }
+        return {
+            'type': 'deleted',
+            'id': item.product_id,
+            'sku': item.sku,
+            'changed_at': changed_at,
+        }
+
+    def get_data(self):
+        changes = sorted(self.updated_products() + self.deleted_products(), key=lambda change: change[0])
+        page = changes[:self.page_size]
+        # Without new changes the client keeps polling from the same cursor.
+        last = page[-1][0] if page else self.position
+        return {
+            'results': [self.represent(position, item) for position, item in page],
+            'next': self.encode_cursor(last) if last is not None else None,
+            'has_more': len(changes) > self.page_size,
+        }
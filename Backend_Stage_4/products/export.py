@@ -0,0 +1,46 @@
+import csv
+import json
+
+from .serializers import ProductSerializer, to_primitive
+
+EXPORT_FIELDS = ProductSerializer.Meta.fields
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+    def write(self, value):
+        return value
+
+
+def buffered(lines, buffer_size):
+    """Join small lines into chunks of about ``buffer_size`` characters."""
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def ndjson_lines(rows, fields):
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode({field: to_primitive(row[field]) for field in fields}) + '\n'
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([to_primitive(row[field]) for field in fields])
+
+
+FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
@@ -0,0 +1,131 @@
+import hashlib
+from collections import Counter
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, Count, Value, When
+
+from . import cache as product_cache
+from pulse_common import instrumentation
+from .models import Product
+
+FACET_FIELDS = ('category', 'stock_status', 'price_band')
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = [
+    ('0-25', Decimal('0'), Decimal('25')),
+    ('25-100', Decimal('25'), Decimal('100')),
+    ('100-500', Decimal('100'), Decimal('500')),
+    ('500+', Decimal('500'), None),
+]
+
+CELLS_KEY = 'products:facets:cells'
+
+
+def price_band(price):
+    for label, low, high in PRICE_BANDS:
+        if high is None or price < high:
+            return label
+    return PRICE_BANDS[-1][0]
+
+
+def price_band_expression():
+    return Case(
+        *[When(price__lt=high, then=Value(label)) for label, _, high in PRICE_BANDS if high is not None],
+        default=Value(PRICE_BANDS[-1][0]),
+    )
+
+
+def cell_for(product):
+    """The (category, stock_status, price_band) cell a product is counted in."""
+    return (product.category, product.stock_status, price_band(product.price))
+
+
+def cell_key(cell):
+    digest = hashlib.sha1('\x1f'.join(cell).encode()).hexdigest()
+    return f'products:facets:cell:{digest}'
+
+
+def count_cells(queryset):
+    """Product counts per facet cell, in one GROUP BY query."""
+    rows = (
+        queryset.order_by()
+        .annotate(price_band=price_band_expression())
+        .values_list(*FACET_FIELDS)
+        .annotate(count=Count('id'))
+    )
+    return {(category, stock, band): count for category, stock, band, count in rows}
+
+
+def summarize(cells):
+    facets = {field: Counter() for field in FACET_FIELDS}
+    for cell, count in cells.items():
+        for field, value in zip(FACET_FIELDS, cell):
+            facets[field][value] += count
+
+    def buckets(counter):
+        return [{'value': value, 'count': count}
+                for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+                if count > 0]
+
+    price_bands = []
+    for label, low, high in PRICE_BANDS:
+        price_bands.append({
+            'value': label,
+            'min': str(low),
+            'max': str(high) if high is not None else None,
+            'count': facets['price_band'][label],
+        })
+    return {
+        'total': sum(cells.values()),
+        'category': buckets(facets['category']),
+        'stock_status': buckets(facets['stock_status']),
+        'price_band': price_bands,
+    }
+
+
+def catalog_cells():
+    """
+    Facet cell counts for the whole catalog.
+
+    Each cell is its own cache counter, adjusted in place by
+    ``product_written()``, so a product write costs a couple of INCR/DECR
+    calls instead of a recount. Any missing counter means the cache can't be
+    trusted and everything is recounted.
+    """
+    cells = cache.get(CELLS_KEY)
+    if cells is not None:
+        counts = cache.get_many([cell_key(cell) for cell in cells])
+        if len(counts) == len(cells):
+            instrumentation.record_cache(True)
+            return {cell: counts[cell_key(cell)] for cell in cells}
+
+    instrumentation.record_cache(False)
+    # Also moves the recount to the primary if a replica could still be behind.
+    product_cache.catalog_version()
+    cells = count_cells(Product.objects.all())
+    timeout = product_cache.get_timeout()
+    cache.set_many({cell_key(cell): count for cell, count in cells.items()}, timeout)
+    cache.set(CELLS_KEY, list(cells), timeout)
+    return cells
+
+
+def product_written(before=None, after=None):
+    """
+    Move one product between facet cells after a create (``after`` only),
+    update (both) or delete (``before`` only).
+    """
+    if before == after:
+        return
+    try:
+        if before is not None:
+            cache.decr(cell_key(before))
+        if after is not None:
+            cache.incr(cell_key(after))
+    except ValueError:
+        # A counter is missing, e.g. a brand new category: recount on next read.
+        invalidate()
+
+
+def invalidate():
+    cache.delete(CELLS_KEY)
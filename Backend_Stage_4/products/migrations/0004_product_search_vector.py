@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:13
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'C')
+"""
+
+CREATE_SEARCH_INDEX = [
+    "CREATE INDEX product_search_idx ON products_product USING gin (search_vector)",
+    """
+    CREATE FUNCTION products_product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {vector};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(vector=SEARCH_VECTOR.format(row='NEW.')),
+    """
+    CREATE TRIGGER products_product_search_vector
+    BEFORE INSERT OR UPDATE ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector()
+    """,
+    "UPDATE products_product SET search_vector = {vector}".format(vector=SEARCH_VECTOR.format(row='')),
+]
+
+DROP_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS products_product_search_vector ON products_product",
+    "DROP FUNCTION IF EXISTS products_product_search_vector()",
+    "DROP INDEX IF EXISTS product_search_idx",
+]
+
+
+def run_on_postgresql(statements):
+    # Other databases keep the column empty and search in process instead.
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_producttombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SEARCH_INDEX),
+            run_on_postgresql(DROP_SEARCH_INDEX),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'stock_status', 'price'], name='product_facet_idx'),
+        ),
+    ]
@@ -1,70 +1,104 @@
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.settings import api_settings
+
+from pulse_common.renderers import ORJSONRenderer
+
+
+def rate_limit_headers(throttles):
+    # Report the first throttle that tracks its state (e.g. SlidingWindowRateThrottle).
+    for throttle in throttles:
+        if getattr(throttle, 'limit', None) is None:
+            continue
+        return {
+            "X-RateLimit-Limit": throttle.limit,
+            "X-RateLimit-Remaining": throttle.remaining,
+            "X-RateLimit-Reset": throttle.reset,
+        }
+    return {}
+
+
+def wrap_body(data, rate_headers):
+    # Wrap the original response data into the standardized structure.
+    return {
+        "product": data,
+        "status": "success",
+        "message": "Request processed successfully.",
+        "headers": rate_headers,
+    }
+
 
 class RateLimitBodyMixin:
     """
     Mixin to add dynamic rate-limit information into the response body.
-    It calculates the current request count using the throttle's cache key.
+    It reports the limit/remaining/reset state the throttle recorded while
+    checking this request, so building the headers costs no cache reads.
     """
+    def get_throttles(self):
+        # Keep the instances that ran the throttle checks so their state can
+        # be reported in finalize_response().
+        if not hasattr(self, '_throttles'):
+            self._throttles = super().get_throttles()
+        return self._throttles
+
     def finalize_response(self, request, response, *args, **kwargs):
         # Call parent's finalize_response() to get the original response.
         response = super().finalize_response(request, response, *args, **kwargs)
-        
-        if isinstance(response.data, dict):
-            rate_headers = {}
-            # Iterate through throttles (assumes one throttle is used, e.g., AnonRateThrottle)
-            for throttle in self.get_throttles():
-                rate = throttle.get_rate()
-                if rate is not None:
-                    try:
-                        # Example rate: "100/min"
-                        limit_str, period = rate.split('/')
-                        limit = int(limit_str)
-                        period = period.lower()
-                        if period == 'min':
-                            duration = 60
-                        elif period == 'sec':
-                            duration = 1
-                        elif period == 'hour':
-                            duration = 3600
-                        else:
-                            duration = 60  # fallback
-                    except Exception:
-                        continue
-
-                    # Use get_cache_key() to retrieve the cache key.
-                    cache_key = throttle.get_cache_key(request, self)
-                    current_requests_val = cache.get(cache_key, [])
-                    # If the cache value is a list, use its length; otherwise, assume it's an int.
-                    if isinstance(current_requests_val, list):
-                        current_requests = len(current_requests_val)
-                    else:
-                        current_requests = current_requests_val
-
-                    remaining = max(limit - current_requests, 0)
-
-                    # Attempt to call throttle.wait(); if it fails, default to duration.
-                    try:
-                        wait_time = throttle.wait()
-                        if wait_time is None:
-                            wait_time = duration
-                        else:
-                            wait_time = int(wait_time)
-                    except AttributeError:
-                        wait_time = duration
-                    
-                    rate_headers = {
-                        "X-RateLimit-Limit": limit,
-                        "X-RateLimit-Remaining": remaining,
-                        "X-RateLimit-Reset": wait_time,
-                    }
-                    break
-
-            # Wrap the original response data into the standardized structure.
-            new_data = {
-                "product": response.data,
-                "status": "success",
-                "message": "Request processed successfully.",
-                "headers": rate_headers,
-            }
-            response.data = new_data
+
+        rate_headers = rate_limit_headers(self.get_throttles())
+        if isinstance(getattr(response, 'data', None), dict):
+            response.data = wrap_body(response.data, rate_headers)
+        else:
+            # No body to wrap (e.g. a streamed export): use real HTTP headers.
+            for header, value in rate_headers.items():
+                response[header] = str(value)
         return response
+
+
+class AsyncRateLimitMixin:
+    """
+    Throttling plus the RateLimitBodyMixin envelope for plain async Django views.
+
+    DRF views are synchronous, so async views can't use DRF's throttling.
+    This runs the configured throttles without blocking the event loop, and
+    handlers build the same enveloped JSON responses with ``respond()``.
+    """
+    throttle_classes = None
+
+    def get_throttles(self):
+        if not hasattr(self, '_throttles'):
+            classes = self.throttle_classes
+            if classes is None:
+                classes = api_settings.DEFAULT_THROTTLE_CLASSES
+            self._throttles = [throttle() for throttle in classes]
+        return self._throttles
+
+    async def throttled_wait(self, request):
+        """None if every throttle allows the request, else the seconds to wait."""
+        waits = []
+        for throttle in self.get_throttles():
+            allow_request = getattr(throttle, 'aallow_request', None)
+            if allow_request is None:
+                allow_request = sync_to_async(throttle.allow_request)
+            if not await allow_request(request, self):
+                waits.append(throttle.wait() or 0)
+        return max(waits) if waits else None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if hasattr(request, 'auser'):
+            # Resolve the lazy user here; throttles read request.user.
+            request.user = await request.auser()
+        wait = await self.throttled_wait(request)
+        if wait is not None:
+            response = self.respond(
+                {"detail": f"Request was throttled. Expected available in {int(wait)} seconds."},
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            response['Retry-After'] = str(int(wait))
+            return response
+        return await super().dispatch(request, *args, **kwargs)
+
+    def respond(self, data, status_code=status.HTTP_200_OK):
+        body = wrap_body(data, rate_limit_headers(self.get_throttles()))
+        return HttpResponse(ORJSONRenderer().render(body), status=status_code, content_type='application/json')
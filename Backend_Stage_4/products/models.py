@@ -1,8 +1,15 @@
 from django.db import models
 
 # Create your models here.
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+
+class ProductManager(models.Manager):
+    def get_queryset(self):
+        # The search vector is only read inside the database.
+        return super().get_queryset().defer('search_vector')
+
 class Product(models.Model):
     STOCK_STATUS_CHOICES = [
         ('in_stock', 'In Stock'),
@@ -17,6 +24,34 @@ class Product(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on PostgreSQL (see migration 0004).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductManager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination in (updated_at, id) order for sync clients.
+            models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+            # Facet filters on the list view and the facet counts.
+            models.Index(fields=['category', 'stock_status', 'price'], name='product_facet_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ProductTombstone(models.Model):
+    """Record of a deleted product, so sync clients can learn about the delete."""
+    product_id = models.BigIntegerField()
+    sku = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Read in (deleted_at, id) order by the change feed.
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.sku} (deleted)'
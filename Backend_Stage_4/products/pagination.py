@@ -0,0 +1,125 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ProductKeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination for the product catalog.
+
+    Selected per request with ``?pagination=cursor`` (or by sending a
+    ``cursor``). Pages are keyed on ``id``, or on ``(updated_at, id)`` with
+    ``?order=updated_at`` for sync clients. Each page is a range seek from the
+    last row of the previous one, so there is no OFFSET scan and no COUNT(*):
+    page 10,000 costs the same as page 1.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    order_query_param = 'order'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 10
+    max_page_size = 100
+    orderings = {
+        'id': ('id',),
+        'updated_at': ('updated_at', 'id'),
+    }
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return params.get(cls.mode_query_param) == 'cursor' or cls.cursor_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_order(self, request):
+        order = request.query_params.get(self.order_query_param, 'id')
+        if order not in self.orderings:
+            raise ValidationError({self.order_query_param: [f'Must be one of: {", ".join(self.orderings)}.']})
+        return order
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            if self.order == 'updated_at':
+                return [datetime.fromisoformat(position[0]), int(position[1])]
+            return [int(position[0])]
+        except (ValueError, TypeError, IndexError, KeyError):
+            raise ValidationError({self.cursor_query_param: ['Invalid cursor.']})
+
+    def filter_after(self, queryset, position):
+        if self.order == 'updated_at':
+            updated_at, pk = position
+            # The plain >= bound keeps this a range scan on the (updated_at, id) index.
+            return queryset.filter(updated_at__gte=updated_at).filter(
+                Q(updated_at__gt=updated_at) | Q(id__gt=pk)
+            )
+        return queryset.filter(id__gt=position[0])
+
+    def get_ordering_fields(self, request):
+        """Columns a .values() queryset must select for this paginator."""
+        return list(self.orderings[self.get_order(request)])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.order = self.get_order(request)
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.orderings[self.order])
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.filter_after(queryset, position)
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if page:
+            last = page[-1]
+            # Rows are model instances, or dicts from a .values() queryset.
+            if not isinstance(last, dict):
+                last = {field: getattr(last, field) for field in self.orderings[self.order]}
+            if self.order == 'updated_at':
+                self.next_position = [last['updated_at'].isoformat(), last['id']]
+            else:
+                self.next_position = [last['id']]
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+        return remove_query_param(url, self.mode_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
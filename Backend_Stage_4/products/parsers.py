@@ -0,0 +1,53 @@
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+loads = orjson.loads if orjson else json.loads
+
+
+def _decoded_lines(stream, encoding):
+    if stream is None:
+        return
+    for line in stream:
+        yield line.decode(encoding)
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON into a lazy iterator of rows.
+
+    Rows are decoded as they are consumed, so a large upload is never held in
+    memory as a whole. A line that is not valid JSON is passed on as its raw
+    text and reported by the serializer as an invalid row.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_rows(_decoded_lines(stream, encoding))
+
+    def iter_rows(self, lines):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield loads(line)
+            except ValueError:
+                yield line
+
+
+class CSVParser(BaseParser):
+    """Parses CSV with a header row into a lazy iterator of dicts."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return csv.DictReader(_decoded_lines(stream, encoding))
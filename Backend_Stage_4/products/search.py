@@ -0,0 +1,85 @@
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+
+from . import cache as product_cache
+from .models import Product
+
+# Field weights, matching the 'A'/'B'/'C' weights of the PostgreSQL vector.
+SEARCH_FIELDS = {'name': 1.0, 'category': 0.4, 'description': 0.2}
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    In-process term -> {product id: score} index.
+
+    Used where the database has no full-text search (SQLite in tests and
+    local runs). It is rebuilt from the table whenever the catalog version
+    changes, so it is only meant for small catalogs.
+    """
+    def __init__(self, rows):
+        self.postings = defaultdict(lambda: defaultdict(float))
+        for row in rows:
+            for field, weight in SEARCH_FIELDS.items():
+                for term in tokenize(row[field] or ''):
+                    self.postings[term][row['id']] += weight
+
+    def search(self, query, limit):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        # Every term must match, like a websearch query without operators.
+        postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+        matches = set(postings[0]).intersection(*postings[1:])
+        scores = {pk: sum(posting[pk] for posting in postings) for pk in matches}
+        ranked = sorted(scores, key=lambda pk: (-scores[pk], pk))[:limit]
+        return [(pk, scores[pk]) for pk in ranked]
+
+
+_index_lock = threading.Lock()
+_index = (None, None)
+
+
+def get_inverted_index():
+    global _index
+    version = product_cache.catalog_version()
+    with _index_lock:
+        if _index[0] != version:
+            rows = Product.objects.values('id', *SEARCH_FIELDS).iterator(chunk_size=2000)
+            _index = (version, InvertedIndex(rows))
+        return _index[1]
+
+
+def search_products(query, limit):
+    """
+    Return up to ``limit`` products matching ``query``, best match first.
+
+    Each product gets a ``rank`` attribute. PostgreSQL answers from the GIN
+    index on ``search_vector``; other databases use the in-process index.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config='english')
+        return list(
+            Product.objects.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', 'id')[:limit]
+        )
+
+    ranked = get_inverted_index().search(query, limit)
+    products = Product.objects.in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, rank in ranked:
+        # Skip products deleted since the index was built.
+        if pk in products:
+            products[pk].rank = rank
+            results.append(products[pk])
+    return results
@@ -1,4 +1,9 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils import timezone
 from rest_framework import serializers
+from pulse_common import instrumentation
 from .models import Product
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -8,3 +13,96 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'category', 'price', 'stock_status',
             'sku', 'description', 'created_at', 'updated_at'
         ]
+
+    def to_representation(self, instance):
+        with instrumentation.timer('serializer'):
+            return super().to_representation(instance)
+
+
+def to_primitive(value):
+    """Represent a ``.values()`` column the way ProductSerializer would."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+    return value
+
+
+class ProductRowSerializer:
+    """
+    Read-only fast path for product lists.
+
+    Works on ``.values()`` rows instead of model instances and skips DRF's
+    per-field machinery, producing the same output as ProductSerializer for
+    the selected ``fields``.
+    """
+    all_fields = ProductSerializer.Meta.fields
+
+    def __init__(self, fields=None):
+        self.fields = list(fields or self.all_fields)
+
+    @classmethod
+    def parse_fields(cls, param):
+        """Validate a ``?fields=`` value; returns the fields in canonical order."""
+        if not param:
+            return list(cls.all_fields)
+        requested = {field.strip() for field in param.split(',') if field.strip()}
+        unknown = requested.difference(cls.all_fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': [f'Unknown field(s): {", ".join(sorted(unknown))}.']})
+        return [field for field in cls.all_fields if field in requested]
+
+    def to_representation(self, rows):
+        fields = self.fields
+        with instrumentation.timer('serializer'):
+            return [{field: to_primitive(row[field]) for field in fields} for row in rows]
+
+
+
+class ProductBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a chunk of bulk rows without failing the chunk on bad rows:
+    ``validated_data`` holds the valid rows and ``row_errors`` maps the
+    index of each invalid row to its errors.
+    """
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        self.row_errors = {}
+        rows = []
+        for index, item in enumerate(data):
+            try:
+                rows.append(self.run_child_validation(item))
+            except serializers.ValidationError as exc:
+                self.row_errors[index] = exc.detail
+        return rows
+
+
+class ProductBulkSerializer(ProductSerializer):
+    """
+    ProductSerializer for bulk upserts: an existing SKU is an update target,
+    not a validation error, so the unique validator on ``sku`` is dropped.
+    """
+    class Meta(ProductSerializer.Meta):
+        list_serializer_class = ProductBulkListSerializer
+        extra_kwargs = {'sku': {'validators': []}}
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """Validates the query parameters accepted by the product list and facets."""
+    category = serializers.CharField(required=False, max_length=255)
+    stock_status = serializers.ChoiceField(choices=Product.STOCK_STATUS_CHOICES, required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    def filter(self, queryset):
+        params = self.validated_data
+        lookups = {
+            'category': params.get('category'),
+            'stock_status': params.get('stock_status'),
+            'price__gte': params.get('min_price'),
+            'price__lte': params.get('max_price'),
+        }
+        return queryset.filter(**{key: value for key, value in lookups.items() if value is not None})
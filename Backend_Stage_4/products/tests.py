@@ -1,9 +1,21 @@
 import pytest
+import csv
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from io import BytesIO
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
+from products import cache as product_cache
+from pulse_common import instrumentation, routers
 from products.models import Product
+from pulse_common.renderers import ORJSONParser, ORJSONRenderer
+from products.views import ProductBulkUpsertAPIView
 from django.core.cache import cache
 
 # Automatically clear the cache before each test to reset throttle state.
@@ -113,9 +125,8 @@ def test_delete_product():
 def test_rate_limiting():
     """
     Using the default throttle rate of 100 requests per minute from settings,
-    this test sends up to 51 POST requests. In this test environment,
-    only 50 requests are allowed before throttling kicks in.
-    We therefore expect exactly 50 allowed requests and that the 51st request returns a 429.
+    this test sends up to 101 POST requests.
+    We therefore expect exactly 100 allowed requests and that the 101st request returns a 429.
     """
     client = APIClient()
     url = reverse('product-list-create')
@@ -127,7 +138,7 @@ def test_rate_limiting():
         "description": "Testing rate limiting"
     }
     allowed_requests = 0
-    total_requests = 51  # We'll check for 50 allowed requests then the 51st should fail.
+    total_requests = 101  # We'll check for 100 allowed requests then the 101st should fail.
     
     for i in range(total_requests):
         data['sku'] = f"THROTTLESKU_{i}"
@@ -137,9 +148,544 @@ def test_rate_limiting():
         elif response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
             break
 
-    # Expect exactly 50 allowed requests.
-    assert allowed_requests == 50, f"Expected 50 allowed requests, got {allowed_requests}"
+    # Expect exactly 100 allowed requests.
+    assert allowed_requests == 100, f"Expected 100 allowed requests, got {allowed_requests}"
     # And a subsequent request should return 429.
     data['sku'] = "THROTTLESKU_extra"
     response = client.post(url, data, format='json')
     assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+def make_products(count, **overrides):
+    return [
+        Product.objects.create(**{
+            "name": f"Product {i}",
+            "category": "Gadgets",
+            "price": Decimal("10.00") + i,
+            "stock_status": "in_stock",
+            "sku": f"SKU-{i}",
+            "description": f"Description {i}",
+            **overrides,
+        })
+        for i in range(count)
+    ]
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_catalog():
+    products = make_products(5)
+    client = APIClient()
+    url = reverse('product-list-create')
+    response = client.get(url, {'pagination': 'cursor', 'page_size': 2})
+    assert response.status_code == status.HTTP_200_OK
+    seen = []
+    while True:
+        body = response.data['product']
+        assert 'count' not in body
+        seen.extend(item['id'] for item in body['results'])
+        if body['next'] is None:
+            break
+        response = client.get(body['next'])
+    assert seen == [p.id for p in products]
+    assert 'X-RateLimit-Limit' in response.data['headers']
+
+@pytest.mark.django_db
+def test_cursor_pagination_by_updated_at():
+    products = make_products(3)
+    # Touch the first product so it sorts last.
+    products[0].name = "Renamed"
+    products[0].save()
+    client = APIClient()
+    url = reverse('product-list-create')
+    response = client.get(url, {'pagination': 'cursor', 'order': 'updated_at', 'page_size': 2})
+    first_page = [item['id'] for item in response.data['product']['results']]
+    response = client.get(response.data['product']['next'])
+    second_page = [item['id'] for item in response.data['product']['results']]
+    assert first_page + second_page == [products[1].id, products[2].id, products[0].id]
+
+@pytest.mark.django_db
+def test_cursor_pagination_rejects_bad_cursor():
+    client = APIClient()
+    url = reverse('product-list-create')
+    response = client.get(url, {'cursor': 'not-a-cursor'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_product_detail_is_cached_with_etag():
+    product = make_products(1)[0]
+    client = APIClient()
+    url = reverse('product-detail', args=[product.id])
+    first = client.get(url)
+    assert first['X-Cache'] == 'MISS'
+    second = client.get(url)
+    assert second['X-Cache'] == 'HIT'
+    assert second.data['product'] == first.data['product']
+    # Rate-limit headers are still computed per request.
+    assert second.data['headers']['X-RateLimit-Remaining'] < first.data['headers']['X-RateLimit-Remaining']
+    not_modified = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+@pytest.mark.django_db
+def test_product_writes_invalidate_cached_responses():
+    product = make_products(1)[0]
+    client = APIClient()
+    list_url = reverse('product-list-create')
+    detail_url = reverse('product-detail', args=[product.id])
+    etag = client.get(detail_url)['ETag']
+    client.get(list_url)
+    client.put(detail_url, {
+        "name": "Updated", "category": "Gadgets", "price": "12.00",
+        "stock_status": "in_stock", "sku": product.sku, "description": "Updated",
+    }, format='json')
+    detail = client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert detail.status_code == status.HTTP_200_OK
+    assert detail.data['product']['name'] == "Updated"
+    listing = client.get(list_url)
+    assert listing['X-Cache'] == 'MISS'
+    assert listing.data['product']['results'][0]['name'] == "Updated"
+
+@pytest.mark.django_db
+def test_throttle_keeps_fixed_size_counters():
+    client = APIClient()
+    url = reverse('product-list-create')
+    first = client.get(url, {'page': 1})
+    second = client.get(url, {'page': 2})
+    remaining = [r.data['headers']['X-RateLimit-Remaining'] for r in (first, second)]
+    assert remaining == [99, 98]
+    from django.contrib.auth.models import AnonymousUser
+    from products.throttling import SlidingWindowRateThrottle
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    throttle = SlidingWindowRateThrottle()
+    throttle.key = throttle.get_cache_key(request, None)
+    throttle.now = throttle.timer()
+    # One integer per window, not DRF's list of timestamps.
+    counters = cache.get_many(throttle.window_keys())
+    assert sum(counters.values()) == 2 and all(isinstance(value, int) for value in counters.values())
+    assert cache.get(throttle.key) is None
+
+@pytest.mark.django_db
+def test_redis_throttle_registers_its_script_once(monkeypatch):
+    import redis
+    from django.core.cache.backends.redis import RedisCache
+    from products import throttling
+
+    class FakeRedis:
+        registered = []
+
+        def register_script(self, source):
+            self.registered.append(source)
+            return lambda keys, args: [1, 1, 0]
+
+    # Only the throttle talks to (a fake) Redis; the response cache stays in memory.
+    monkeypatch.setattr(throttling, 'redis_location', lambda: 'redis://cache:6379/1')
+    monkeypatch.setattr(redis.Redis, 'from_url', classmethod(lambda cls, url: FakeRedis()))
+    monkeypatch.setattr(throttling.SlidingWindowRateThrottle, 'cache', RedisCache('redis://cache:6379/1', {}))
+    throttling.redis_script.cache_clear()
+    client = APIClient()
+    for _ in range(3):
+        response = client.get(reverse('product-list-create'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['headers']['X-RateLimit-Remaining'] == 99
+    assert FakeRedis.registered == [throttling.SLIDING_WINDOW_SCRIPT]
+    throttling.redis_script.cache_clear()
+
+def test_token_bucket_throttle_refills_continuously():
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from products.throttling import TokenBucketRateThrottle
+
+    class ThreePerMinute(TokenBucketRateThrottle):
+        rate = '3/min'
+
+    request = Request(APIRequestFactory().get('/'))
+    clock = [1000.0]
+
+    def check():
+        throttle = ThreePerMinute()
+        throttle.timer = lambda: clock[0]
+        return throttle.allow_request(request, None), throttle
+
+    results = [check() for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert [t.remaining for _, t in results] == [2, 1, 0, 0]
+    # One token (60s / 3) comes back after 20 seconds.
+    assert results[-1][1].wait() == 20
+    clock[0] += 20
+    allowed, throttle = check()
+    assert allowed and throttle.remaining == 0
+
+@pytest.mark.django_db
+def test_bulk_upsert_json_creates_and_updates_by_sku():
+    existing = make_products(1)[0]
+    client = APIClient()
+    url = reverse('product-bulk-upsert')
+    rows = [
+        {"name": "Renamed", "category": "Gadgets", "price": "5.00", "stock_status": "out_of_stock",
+         "sku": existing.sku, "description": "Updated"},
+        {"name": "New", "category": "Books", "price": "7.50", "stock_status": "in_stock",
+         "sku": "NEW-1", "description": "Brand new"},
+        {"name": "Broken", "category": "Books", "price": "not-a-price", "sku": "BAD-1", "description": "x"},
+    ]
+    response = client.post(url, rows, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    summary = response.data['product']
+    assert (summary['rows'], summary['created'], summary['updated']) == (3, 1, 1)
+    assert summary['errors'][0]['row'] == 3
+    assert 'price' in summary['errors'][0]['errors']
+    existing.refresh_from_db()
+    assert existing.name == "Renamed" and existing.stock_status == "out_of_stock"
+    assert Product.objects.count() == 2
+
+@pytest.mark.django_db
+def test_bulk_upsert_accepts_ndjson_and_csv():
+    client = APIClient()
+    url = reverse('product-bulk-upsert')
+    ndjson = (
+        '{"name": "A", "category": "C", "price": "1.00", "sku": "A-1", "description": "a"}\n'
+        'not json\n'
+    )
+    response = client.post(url, ndjson, content_type='application/x-ndjson')
+    assert response.data['product']['created'] == 1
+    assert response.data['product']['errors'][0]['row'] == 2
+
+    csv_body = (
+        "name,category,price,stock_status,sku,description\n"
+        "B,C,2.00,in_stock,B-1,\"multi, part\"\n"
+        "A2,C,3.00,in_stock,A-1,a\n"
+    )
+    response = client.post(url, csv_body, content_type='text/csv')
+    assert (response.data['product']['created'], response.data['product']['updated']) == (1, 1)
+    assert Product.objects.get(sku="B-1").description == "multi, part"
+    assert Product.objects.get(sku="A-1").name == "A2"
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('body', [5, "A-1", {"sku": "A-1"}, None])
+def test_bulk_upsert_rejects_body_that_is_not_a_list(body):
+    response = APIClient().post(reverse('product-bulk-upsert'), json.dumps(body), content_type='application/json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['product'] == {"error": "Expected a list of products."}
+    assert not Product.objects.exists()
+
+@pytest.mark.django_db
+def test_bulk_upsert_reports_malformed_upload(monkeypatch):
+    monkeypatch.setattr(ProductBulkUpsertAPIView, 'chunk_size', 1)
+    client = APIClient()
+    url = reverse('product-bulk-upsert')
+    csv_body = (
+        b"name,category,price,stock_status,sku,description\n"
+        b"A,C,1.00,in_stock,A-1,a\n"
+        b"B,C,2.00,in_stock,B-1,\xff\xfe\n"
+    )
+    response = client.post(url, csv_body, content_type='text/csv')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    summary = response.data['product']
+    assert (summary['rows'], summary['created'], summary['partial']) == (1, 1, True)
+    assert summary['error'].startswith('Malformed upload after row 1')
+    assert list(Product.objects.values_list('sku', flat=True)) == ['A-1']
+
+    huge_field = b'x' * (csv.field_size_limit() + 1)
+    response = client.post(url, b'name,sku\n' + huge_field + b',Z-1\n', content_type='text/csv')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['product']['partial'] is False
+
+@pytest.mark.django_db
+def test_export_streams_ndjson_matching_api_representation():
+    product = make_products(3)[0]
+    client = APIClient()
+    response = client.get(reverse('product-export'))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    assert response['Content-Type'].startswith('application/x-ndjson')
+    assert 'X-RateLimit-Remaining' in response
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert len(lines) == 3
+    detail = client.get(reverse('product-detail', args=[product.id])).data['product']
+    assert json.loads(lines[0]) == detail
+
+@pytest.mark.django_db
+def test_export_streams_csv():
+    make_products(2, description='multi, part')
+    client = APIClient()
+    response = client.get(reverse('product-export'), {'output': 'csv'})
+    assert response['Content-Type'].startswith('text/csv')
+    rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+    assert [row['sku'] for row in rows] == ['SKU-0', 'SKU-1']
+    assert rows[1]['price'] == '11.00' and rows[1]['description'] == 'multi, part'
+    assert client.get(reverse('product-export'), {'output': 'xml'}).status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_changes_feed_reports_updates_and_deletes_since_cursor(settings):
+    settings.PRODUCT_CHANGES_LAG = 0
+    first, second, third = make_products(3)
+    client = APIClient()
+    url = reverse('product-changes')
+    response = client.get(url, {'page_size': 2})
+    feed = response.data['product']
+    assert [change['id'] for change in feed['results']] == [first.id, second.id]
+    assert feed['has_more']
+    feed = client.get(url, {'since': feed['next']}).data['product']
+    assert [change['id'] for change in feed['results']] == [third.id]
+    assert not feed['has_more']
+    cursor = feed['next']
+
+    # Nothing new: the same cursor comes back.
+    assert client.get(url, {'since': cursor}).data['product']['next'] == cursor
+
+    client.put(reverse('product-detail', args=[first.id]), {
+        "name": "Renamed", "category": "Gadgets", "price": "10.00",
+        "stock_status": "out_of_stock", "sku": first.sku, "description": "x",
+    }, format='json')
+    client.delete(reverse('product-detail', args=[second.id]))
+    changes = client.get(url, {'since': cursor}).data['product']['results']
+    assert [(change['type'], change['id']) for change in changes] == [
+        ('updated', first.id), ('deleted', second.id),
+    ]
+    assert changes[0]['product']['name'] == "Renamed"
+    assert changes[1]['sku'] == second.sku
+    assert client.get(url, {'since': 'bogus'}).status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_changes_feed_delivers_changes_committed_after_a_later_cursor(settings):
+    settings.PRODUCT_CHANGES_LAG = 10
+    now = datetime.now(dt_timezone.utc)
+    old, recent = make_products(2)
+    Product.objects.filter(pk=old.pk).update(updated_at=now - timedelta(seconds=60))
+    # Committed already, but younger than the lag: held back.
+    Product.objects.filter(pk=recent.pk).update(updated_at=now - timedelta(seconds=3))
+    client = APIClient()
+    url = reverse('product-changes')
+    feed = client.get(url).data['product']
+    assert [change['id'] for change in feed['results']] == [old.id]
+
+    # A slow transaction commits a change stamped before `recent`.
+    late = Product.objects.create(name="Late", category="Gadgets", price=Decimal("1.00"),
+                                  sku="SKU-LATE", description="x")
+    Product.objects.filter(pk=late.pk).update(updated_at=now - timedelta(seconds=8))
+    settings.PRODUCT_CHANGES_LAG = 0
+    cache.clear()
+    feed = client.get(url, {'since': feed['next']}).data['product']
+    assert [change['id'] for change in feed['results']] == [late.id, recent.id]
+
+@pytest.mark.django_db
+def test_search_ranks_name_matches_first_and_tracks_writes():
+    client = APIClient()
+    url = reverse('product-search')
+    make_products(1, name="Desk lamp", sku="LAMP-1", description="Warm light")
+    make_products(1, name="Bulb", sku="BULB-1", description="Spare bulb for a desk lamp")
+    make_products(1, name="Chair", sku="CHAIR-1", description="Office chair")
+    results = client.get(url, {'q': 'desk LAMP'}).data['product']['results']
+    assert [product['sku'] for product in results] == ["LAMP-1", "BULB-1"]
+    assert results[0]['rank'] > results[1]['rank']
+
+    client.post(reverse('product-list-create'), {
+        "name": "Lamp shade", "category": "Lighting", "price": "5.00",
+        "stock_status": "in_stock", "sku": "SHADE-1", "description": "Fits any desk lamp",
+    }, format='json')
+    results = client.get(url, {'q': 'desk lamp'}).data['product']['results']
+    assert "SHADE-1" in [product['sku'] for product in results]
+    assert client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_list_filters_by_category_stock_status_and_price():
+    make_products(3)
+    make_products(1, sku="OUT-1", stock_status="out_of_stock")
+    make_products(1, sku="BOOK-1", category="Books", price=Decimal("30.00"))
+    client = APIClient()
+    url = reverse('product-list-create')
+    response = client.get(url, {'category': 'Gadgets', 'stock_status': 'in_stock', 'max_price': '11.00'})
+    assert [product['sku'] for product in response.data['product']['results']] == ["SKU-0", "SKU-1"]
+    response = client.get(url, {'min_price': '25'})
+    assert [product['sku'] for product in response.data['product']['results']] == ["BOOK-1"]
+    assert client.get(url, {'stock_status': 'sold'}).status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_facet_counts_follow_product_writes():
+    make_products(2)
+    make_products(1, sku="BOOK-1", category="Books", price=Decimal("120.00"))
+    client = APIClient()
+    url = reverse('product-facets')
+
+    def counts(facet, **params):
+        data = client.get(url, params).data['product']
+        return {bucket['value']: bucket['count'] for bucket in data[facet] if bucket['count']}
+
+    assert counts('category') == {"Gadgets": 2, "Books": 1}
+    assert counts('price_band') == {"0-25": 2, "100-500": 1}
+
+    book = Product.objects.get(sku="BOOK-1")
+    client.put(reverse('product-detail', args=[book.id]), {
+        "name": "Book", "category": "Books", "price": "20.00",
+        "stock_status": "out_of_stock", "sku": "BOOK-1", "description": "x",
+    }, format='json')
+    client.delete(reverse('product-detail', args=[Product.objects.get(sku="SKU-0").id]))
+    client.post(reverse('product-list-create'), {
+        "name": "Toy", "category": "Toys", "price": "600.00",
+        "stock_status": "in_stock", "sku": "TOY-1", "description": "x",
+    }, format='json')
+    assert counts('category') == {"Gadgets": 1, "Books": 1, "Toys": 1}
+    assert counts('stock_status') == {"in_stock": 2, "out_of_stock": 1}
+    assert counts('price_band') == {"0-25": 2, "500+": 1}
+    assert counts('category', stock_status='in_stock') == {"Gadgets": 1, "Toys": 1}
+
+@pytest.mark.django_db
+def test_list_sparse_fieldsets_narrow_the_output():
+    products = make_products(3)
+    client = APIClient()
+    url = reverse('product-list-create')
+    full = client.get(url).data['product']['results']
+    detail = client.get(reverse('product-detail', args=[products[0].id])).data['product']
+    assert full[0] == detail
+
+    response = client.get(url, {'fields': 'price,id'})
+    assert response.data['product']['results'][0] == {"id": products[0].id, "price": "10.00"}
+
+    response = client.get(url, {'fields': 'name', 'pagination': 'cursor', 'order': 'updated_at', 'page_size': 2})
+    page = response.data['product']
+    assert page['results'] == [{"name": "Product 0"}, {"name": "Product 1"}]
+    response = client.get(page['next'])
+    assert response.data['product']['results'] == [{"name": "Product 2"}]
+
+    response = client.get(url, {'fields': 'name,secret'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_orjson_renderer_matches_default_renderer():
+    data = {
+        "price": Decimal("10.50"),
+        "updated_at": datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+        "name": "Caf\u00e9 \u2028",
+        1: [None, True, 1.5],
+    }
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+    # Falls back to the stdlib renderer for what orjson can't encode.
+    assert ORJSONRenderer().render({"big": 2 ** 70}) == JSONRenderer().render({"big": 2 ** 70})
+    assert ORJSONRenderer().render(data, 'application/json; indent=2') == \
+        JSONRenderer().render(data, 'application/json; indent=2')
+    assert ORJSONParser().parse(BytesIO('{"name": "Caf\u00e9"}'.encode())) == {"name": "Caf\u00e9"}
+    with pytest.raises(ParseError):
+        ORJSONParser().parse(BytesIO(b'{"name":'))
+
+@pytest.mark.django_db
+def test_async_views_match_sync_views():
+    products = make_products(12)
+    client = APIClient()
+    sync_page = client.get(reverse('product-list-create'), {'page': 2}).data['product']
+    response = client.get(reverse('product-list-async'), {'page': 2})
+    assert response.status_code == status.HTTP_200_OK
+    async_page = response.json()['product']
+    assert async_page['results'] == sync_page['results']
+    assert async_page['count'] == 12 and async_page['next'] is None
+    assert async_page['previous'].endswith(reverse('product-list-async'))
+    assert response.json()['headers']['X-RateLimit-Limit'] == 100
+
+    detail = client.get(reverse('product-detail-async', args=[products[0].id])).json()['product']
+    assert detail == client.get(reverse('product-detail', args=[products[0].id])).data['product']
+    response = client.get(reverse('product-detail-async', args=[0]))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = client.get(reverse('product-list-async'), {'page': 5})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', ['product-list-create', 'product-list-async'])
+def test_sync_and_async_views_share_the_rate_limit(name):
+    make_products(1)
+    client = APIClient()
+    url = reverse(name)
+    statuses = [client.get(url).status_code for _ in range(101)]
+    assert statuses.count(status.HTTP_200_OK) == 100
+    response = client.get(url)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response['Retry-After']) > 0
+
+@pytest.mark.django_db
+def test_performance_middleware_reports_server_timing_and_metrics(settings, monkeypatch):
+    settings.PERF_SAMPLE_RATE = 1.0
+    monkeypatch.setattr(instrumentation, 'registry', instrumentation.MetricsRegistry('web-1'))
+    product = make_products(1)[0]
+    client = APIClient()
+    url = reverse('product-detail', args=[product.id])
+    response = client.get(url)
+    timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+    assert set(timing) == {'db', 'throttle', 'serializer', 'render', 'cache', 'total'}
+    assert 'queries"' in timing['db'] and '0 queries' not in timing['db']
+    assert timing['cache'] == 'desc="hit=0 miss=1"'
+    assert 'hit=1' in client.get(url)['Server-Timing']
+
+    metrics = client.get(reverse('metrics')).content.decode()
+    assert 'http_request_duration_seconds_count{route="product-detail",method="GET",worker="web-1"} 2' in metrics
+    assert 'http_request_cache_hits_total{route="product-detail",worker="web-1"} 1' in metrics
+
+    settings.PERF_SAMPLE_RATE = 0.0
+    assert 'Server-Timing' not in client.get(url)
+
+@pytest.mark.django_db
+def test_performance_middleware_times_queries_of_async_views(settings, monkeypatch):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncClient
+    settings.PERF_SAMPLE_RATE = 1.0
+    monkeypatch.setattr(instrumentation, 'registry', instrumentation.MetricsRegistry('web-1'))
+    make_products(3)
+    # The view's queries run in sync_to_async threads, not the event loop's.
+    response = async_to_sync(AsyncClient().get)(reverse('product-list-async'))
+    assert response.status_code == status.HTTP_200_OK
+    timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+    assert 'queries"' in timing['db'] and '0 queries' not in timing['db']
+
+def test_database_settings_come_from_environment(monkeypatch):
+    from django.core.exceptions import ImproperlyConfigured
+    from pulse_common import database
+    monkeypatch.setenv('DATABASE_URL', 'postgres://app:secret@db:5432/catalog')
+    monkeypatch.setenv('DB_CONN_MAX_AGE', '300')
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT', '5000')
+    config = database.default_database('pulse4DB')
+    assert (config['NAME'], config['HOST'], config['CONN_MAX_AGE']) == ('catalog', 'db', 300)
+    assert config['CONN_HEALTH_CHECKS'] is True
+    assert config['OPTIONS']['options'] == '-c statement_timeout=5000'
+
+    monkeypatch.setenv('SERVER', 'uvicorn')
+    monkeypatch.delenv('DB_CONN_MAX_AGE')
+    assert database.default_database('pulse4DB')['CONN_MAX_AGE'] == 0
+
+    monkeypatch.setenv('DB_POOL', 'true')
+    monkeypatch.setenv('DB_MAX_CONNECTIONS', '40')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        with pytest.raises(ImproperlyConfigured):
+            database.default_database('pulse4DB')
+    else:
+        config = database.default_database('pulse4DB')
+        assert config['OPTIONS']['pool']['max_size'] == 4 and config['CONN_MAX_AGE'] == 0
+        # One connection per worker thread, within the budget.
+        monkeypatch.setenv('GUNICORN_CMD_ARGS', '--threads=16')
+        assert database.default_database('pulse4DB')['OPTIONS']['pool']['max_size'] == 10
+        monkeypatch.setenv('DB_MAX_CONNECTIONS', '100')
+        assert database.default_database('pulse4DB')['OPTIONS']['pool']['max_size'] == 16
+
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:////tmp/catalog.db')
+    assert 'OPTIONS' not in database.default_database('pulse4DB')
+
+
+def test_replica_router_keeps_writers_on_the_primary(settings):
+    settings.DATABASE_REPLICAS = ['replica1']
+    router = routers.ReplicaRouter()
+    assert router.db_for_read(Product) == 'replica1'
+    assert router.db_for_write(Product) == 'default'
+    assert not router.allow_migrate('replica1', 'products')
+
+    def view(request):
+        if request.method == 'POST':
+            router.db_for_write(Product)
+        elif 'catalog' in request.GET:
+            product_cache.catalog_version()
+        return HttpResponse(router.db_for_read(Product))
+
+    middleware = routers.PrimaryPinningMiddleware(view)
+    factory = RequestFactory()
+    assert middleware(factory.get('/')).content == b'replica1'
+    assert middleware(factory.post('/')).content == b'default'
+    # The writer reads its own writes; other clients keep using the replica.
+    assert middleware(factory.get('/')).content == b'default'
+    assert middleware(factory.get('/', REMOTE_ADDR='10.0.0.9')).content == b'replica1'
+    # Right after a catalog write nobody caches rows read from a replica.
+    product_cache.product_changed()
+    assert middleware(factory.get('/?catalog', REMOTE_ADDR='10.0.0.9')).content == b'default'
@@ -0,0 +1,211 @@
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import AnonRateThrottle
+
+from pulse_common import instrumentation
+
+# Atomically reads both window counters and, if the request is allowed,
+# increments the current one. KEYS: current, previous window.
+# ARGV: previous-window weight, limit, counter TTL.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local estimate = math.ceil(previous * tonumber(ARGV[1])) + current
+if estimate >= tonumber(ARGV[2]) then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return {1, current, previous}
+"""
+
+# GCRA token bucket: the only state is the bucket's "theoretical arrival
+# time" in microseconds. KEYS: bucket. ARGV: now, emission interval,
+# bucket capacity (all in microseconds), key TTL in seconds.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then
+    tat = now
+end
+local new_tat = tat + tonumber(ARGV[2])
+if new_tat - now > tonumber(ARGV[3]) then
+    return {0, tat}
+end
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'EX', ARGV[4])
+return {1, new_tat}
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def redis_script(location, source):
+    """
+    A Lua script for the Redis server at ``location``, built once per process.
+    redis-py keeps its SHA and runs it with EVALSHA on every call.
+    """
+    import redis
+
+    return redis.Redis.from_url(location).register_script(source)
+
+
+def redis_location():
+    # Throttles use the default cache; RedisCache writes to its first server.
+    location = settings.CACHES['default']['LOCATION']
+    return (location.split(',') if isinstance(location, str) else location)[0]
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Parse '100/min' into (100, 60) once per distinct rate string."""
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+class RateLimitStateThrottle(AnonRateThrottle):
+    """
+    Base for throttles that keep fixed-size state per client.
+
+    After ``allow_request()`` the instance exposes ``limit``, ``remaining``
+    and ``reset`` (seconds), which RateLimitBodyMixin reports without going
+    back to the cache.
+    """
+    def __init__(self):
+        super().__init__()
+        self.limit = self.num_requests
+        self.remaining = self.num_requests
+        self.reset = self.duration
+
+    def parse_rate(self, rate):
+        if rate is None:
+            return (None, None)
+        return parse_rate(rate)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        with instrumentation.timer('throttle'):
+            if isinstance(self.cache, RedisCache):
+                return self.hit_redis()
+            return self.hit_cache()
+
+    async def aallow_request(self, request, view):
+        """
+        allow_request() for async views. The cache round trips run in a worker
+        thread, so a slow cache never blocks the event loop.
+        """
+        return await sync_to_async(self.allow_request, thread_sensitive=False)(request, view)
+
+    def run_script(self, script, keys, args):
+        keys = [self.cache.make_and_validate_key(key) for key in keys]
+        return redis_script(redis_location(), script)(keys=keys, args=args)
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        return self.reset
+
+
+class SlidingWindowRateThrottle(RateLimitStateThrottle):
+    """
+    Anonymous per-IP throttle using a sliding-window counter.
+
+    Instead of DRF's list of request timestamps, each client has one integer
+    counter per window; the previous window's count is weighted by how much
+    of it still overlaps the sliding window. The check-and-increment is a
+    single atomic round trip on Redis (a Lua script), so the limit holds
+    across all workers and hosts sharing the cache. Other cache backends
+    (e.g. LocMemCache in tests) fall back to get_many + incr, which is not
+    atomic and only holds the limit within a single process.
+    """
+    def window_keys(self):
+        window = int(self.now // self.duration)
+        return f'{self.key}:{window}', f'{self.key}:{window - 1}'
+
+    def previous_weight(self):
+        return 1 - (self.now % self.duration) / self.duration
+
+    def estimate(self, current, previous):
+        # Rounding up keeps the estimate exact at window boundaries.
+        return math.ceil(previous * self.previous_weight()) + current
+
+    def hit_redis(self):
+        allowed, current, previous = self.run_script(
+            SLIDING_WINDOW_SCRIPT,
+            keys=self.window_keys(),
+            args=[self.previous_weight(), self.num_requests, 2 * self.duration],
+        )
+        return self.record(bool(allowed), int(current), int(previous))
+
+    def hit_cache(self):
+        current_key, previous_key = self.window_keys()
+        counts = self.cache.get_many([current_key, previous_key])
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+        if self.estimate(current, previous) >= self.num_requests:
+            return self.record(False, current, previous)
+        if self.cache.add(current_key, 1, 2 * self.duration):
+            return self.record(True, 1, previous)
+        return self.record(True, self.cache.incr(current_key), previous)
+
+    def record(self, allowed, current, previous):
+        self.remaining = max(self.num_requests - self.estimate(current, previous), 0)
+        # The weighted previous window drains continuously; the current one
+        # is certain to be free once it ends.
+        self.reset = math.ceil(self.duration - (self.now % self.duration))
+        return self.throttle_success() if allowed else self.throttle_failure()
+
+
+class TokenBucketRateThrottle(RateLimitStateThrottle):
+    """
+    Anonymous per-IP token bucket (GCRA).
+
+    The bucket holds ``limit`` tokens and refills continuously at
+    ``limit / duration`` tokens per second, so bursts are allowed but the
+    long-run rate is capped smoothly rather than per window. The whole state
+    is one integer per client; on Redis the check is one atomic round trip.
+    Without Redis, the get + set fallback only suits a single process.
+    """
+    def bucket_parameters(self):
+        capacity = self.duration * 1_000_000
+        return int(self.now * 1_000_000), capacity // self.num_requests, capacity
+
+    def hit_redis(self):
+        now, interval, capacity = self.bucket_parameters()
+        allowed, tat = self.run_script(
+            TOKEN_BUCKET_SCRIPT,
+            keys=[self.key],
+            args=[now, interval, capacity, self.duration],
+        )
+        return self.record(bool(allowed), int(tat))
+
+    def hit_cache(self):
+        now, interval, capacity = self.bucket_parameters()
+        tat = max(self.cache.get(self.key, now), now)
+        if tat + interval - now > capacity:
+            return self.record(False, tat)
+        tat += interval
+        self.cache.set(self.key, tat, self.duration)
+        return self.record(True, tat)
+
+    def record(self, allowed, tat):
+        now, interval, capacity = self.bucket_parameters()
+        backlog = max(tat - now, 0)
+        self.remaining = max((capacity - backlog) // interval, 0)
+        if allowed:
+            # Seconds until the bucket is full again.
+            self.reset = math.ceil(backlog / 1_000_000)
+        else:
+            # Seconds until the next token is available.
+            self.reset = math.ceil((backlog + interval - capacity) / 1_000_000)
+        return self.throttle_success() if allowed else self.throttle_failure()
@@ -1,7 +1,24 @@
 from django.urls import path
-from .views import ProductListCreateAPIView, ProductRetrieveUpdateDestroyAPIView
+from .async_views import ProductDetailAsyncView, ProductListAsyncView
+from .views import (
+    ProductBulkUpsertAPIView,
+    ProductChangesAPIView,
+    ProductExportAPIView,
+    ProductFacetsAPIView,
+    ProductListCreateAPIView,
+    ProductRetrieveUpdateDestroyAPIView,
+    ProductSearchAPIView,
+)
 
 urlpatterns = [
     path('products/', ProductListCreateAPIView.as_view(), name='product-list-create'),
+    path('products/bulk/', ProductBulkUpsertAPIView.as_view(), name='product-bulk-upsert'),
+    path('products/changes/', ProductChangesAPIView.as_view(), name='product-changes'),
+    path('products/facets/', ProductFacetsAPIView.as_view(), name='product-facets'),
+    path('products/search/', ProductSearchAPIView.as_view(), name='product-search'),
+    path('products/export/', ProductExportAPIView.as_view(), name='product-export'),
     path('products/<int:id>/', ProductRetrieveUpdateDestroyAPIView.as_view(), name='product-detail'),
+    # Async (ASGI) read endpoints; same responses as the ones above.
+    path('async/products/', ProductListAsyncView.as_view(), name='product-list-async'),
+    path('async/products/<int:id>/', ProductDetailAsyncView.as_view(), name='product-detail-async'),
 ]
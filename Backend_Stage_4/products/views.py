@@ -1,35 +1,84 @@
+import csv
+from collections.abc import Iterator
+from itertools import islice
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.throttling import AnonRateThrottle
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ParseError, ValidationError
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Product
-from .serializers import ProductSerializer
+from . import cache as product_cache
+from . import export
+from . import facets as product_facets
+from .changes import ProductChangeFeed
+from .models import Product, ProductTombstone
+from .parsers import CSVParser, NDJSONParser
+from pulse_common.renderers import ORJSONParser
+from .serializers import (
+    ProductBulkSerializer,
+    ProductFilterSerializer,
+    ProductRowSerializer,
+    ProductSerializer,
+)
 from .mixins import RateLimitBodyMixin  # Import the mixin
+from .pagination import ProductKeysetPagination
+from .search import search_products
 
 # List and Create View with RateLimitBodyMixin
 class ProductListCreateAPIView(RateLimitBodyMixin, generics.ListCreateAPIView):
     queryset = Product.objects.all().order_by('id')
     serializer_class = ProductSerializer
-    throttle_classes = [AnonRateThrottle]
+
+    @property
+    def paginator(self):
+        # Page numbers by default; keyset pagination when the client asks for it.
+        if not hasattr(self, '_paginator'):
+            if ProductKeysetPagination.is_requested(self.request):
+                self._paginator = ProductKeysetPagination()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+    def filter_queryset(self, queryset):
+        filters = ProductFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return filters.filter(queryset)
 
     @swagger_auto_schema(
-        operation_description="Retrieve a paginated list of products.",
+        operation_description="Retrieve a paginated list of products. "
+                              "Use ?pagination=cursor (and ?order=updated_at) for keyset pagination. "
+                              "Filter with ?category=, ?stock_status=, ?min_price= and ?max_price=. "
+                              "Use ?fields=id,name,price to return only some fields.",
         operation_summary="Retrieve a paginated list of products.",
+        query_serializer=ProductFilterSerializer,
         responses={200: ProductSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
-        self.initial(request, *args, **kwargs)  # Trigger throttle checks.
         try:
-            queryset = self.get_queryset()
+            cache_key = product_cache.response_cache_key(request)
+            entry = product_cache.get_entry(cache_key)
+            if entry is not None:
+                return product_cache.entry_response(request, entry, hit=True)
+            fields = ProductRowSerializer.parse_fields(request.query_params.get('fields'))
+            serializer = ProductRowSerializer(fields)
+            columns = set(fields)
+            if isinstance(self.paginator, ProductKeysetPagination):
+                columns.update(self.paginator.get_ordering_fields(request))
+            # Only the requested columns are read, as plain rows.
+            queryset = self.filter_queryset(self.get_queryset()).values(*columns)
             page = self.paginate_queryset(queryset)
             if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+                data = self.get_paginated_response(serializer.to_representation(page)).data
+            else:
+                data = serializer.to_representation(queryset)
+            entry = product_cache.set_entry(cache_key, data)
+            return product_cache.entry_response(request, entry, hit=False)
+        except ValidationError as e:
+            return Response({"error": e.detail},
+                            status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -41,7 +90,6 @@ class ProductListCreateAPIView(RateLimitBodyMixin, generics.ListCreateAPIView):
         responses={201: ProductSerializer()}
     )
     def post(self, request, *args, **kwargs):
-        self.initial(request, *args, **kwargs)  # Trigger throttle checks.
         try:
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
@@ -54,11 +102,15 @@ class ProductListCreateAPIView(RateLimitBodyMixin, generics.ListCreateAPIView):
             return Response({"error": str(e)},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def perform_create(self, serializer):
+        product = serializer.save()
+        product_cache.product_changed()
+        product_facets.product_written(after=product_facets.cell_for(product))
+
 # Retrieve, Update, Delete View with RateLimitBodyMixin
 class ProductRetrieveUpdateDestroyAPIView(RateLimitBodyMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    throttle_classes = [AnonRateThrottle]
     lookup_field = 'id'
 
     @swagger_auto_schema(
@@ -67,11 +119,15 @@ class ProductRetrieveUpdateDestroyAPIView(RateLimitBodyMixin, generics.RetrieveU
         responses={200: ProductSerializer()}
     )
     def get(self, request, *args, **kwargs):
-        self.initial(request, *args, **kwargs)
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            cache_key = product_cache.response_cache_key(request)
+            entry = product_cache.get_entry(cache_key)
+            if entry is None:
+                instance = self.get_object()
+                serializer = self.get_serializer(instance)
+                entry = product_cache.set_entry(cache_key, serializer.data)
+                return product_cache.entry_response(request, entry, hit=False)
+            return product_cache.entry_response(request, entry, hit=True)
         except Product.DoesNotExist:
             return Response({"error": "Product not found."},
                             status=status.HTTP_404_NOT_FOUND)
@@ -86,7 +142,6 @@ class ProductRetrieveUpdateDestroyAPIView(RateLimitBodyMixin, generics.RetrieveU
         responses={200: ProductSerializer()}
     )
     def put(self, request, *args, **kwargs):
-        self.initial(request, *args, **kwargs)
         try:
             instance = self.get_object()
             serializer = self.get_serializer(instance, data=request.data)
@@ -109,7 +164,6 @@ class ProductRetrieveUpdateDestroyAPIView(RateLimitBodyMixin, generics.RetrieveU
         responses={204: 'No Content'}
     )
     def delete(self, request, *args, **kwargs):
-        self.initial(request, *args, **kwargs)
         try:
             instance = self.get_object()
             self.perform_destroy(instance)
@@ -121,3 +175,221 @@ class ProductRetrieveUpdateDestroyAPIView(RateLimitBodyMixin, generics.RetrieveU
             return Response({"error": str(e)},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def perform_update(self, serializer):
+        before = product_facets.cell_for(serializer.instance)
+        product = serializer.save()
+        product_cache.product_changed()
+        product_facets.product_written(before=before, after=product_facets.cell_for(product))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            ProductTombstone.objects.create(product_id=instance.id, sku=instance.sku)
+            instance.delete()
+        product_cache.product_changed()
+        product_facets.product_written(before=product_facets.cell_for(instance))
+
+
+# Bulk import/upsert keyed on SKU
+class ProductBulkUpsertAPIView(RateLimitBodyMixin, generics.GenericAPIView):
+    serializer_class = ProductBulkSerializer
+    parser_classes = [ORJSONParser, NDJSONParser, CSVParser]
+    chunk_size = 1000
+    max_reported_errors = 1000
+    update_fields = ['name', 'category', 'price', 'stock_status', 'description', 'updated_at']
+
+    @swagger_auto_schema(
+        operation_description="Create or update products by SKU from a JSON array, "
+                              "NDJSON (application/x-ndjson) or CSV (text/csv) upload.",
+        operation_summary="Bulk create or update products by SKU.",
+        request_body=ProductBulkSerializer(many=True),
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            rows = request.data
+        except ParseError as e:
+            return Response({"error": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        # A JSON array, or the row iterator of the NDJSON and CSV parsers.
+        if not isinstance(rows, (list, Iterator)):
+            return Response({"error": "Expected a list of products."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        summary = {"rows": 0, "created": 0, "updated": 0, "errors": []}
+        rows = iter(rows)
+        malformed = None
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.upsert_chunk(chunk, summary)
+        except (UnicodeDecodeError, csv.Error) as e:
+            # The upload is parsed as it is read: earlier chunks are committed already.
+            malformed = e
+
+        if summary["created"] or summary["updated"]:
+            product_cache.product_changed()
+            product_facets.invalidate()
+        written = summary["created"] + summary["updated"]
+        if malformed is not None:
+            summary["error"] = f"Malformed upload after row {summary['rows']}: {malformed}"
+            summary["partial"] = bool(written)
+            return Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_200_OK if written or not summary["rows"] else status.HTTP_400_BAD_REQUEST
+        return Response(summary, status=response_status)
+
+    def upsert_chunk(self, chunk, summary):
+        offset = summary["rows"]
+        summary["rows"] += len(chunk)
+        serializer = self.get_serializer(data=chunk, many=True)
+        serializer.is_valid()  # Bad rows are collected in row_errors, not raised.
+        for index, errors in serializer.row_errors.items():
+            if len(summary["errors"]) < self.max_reported_errors:
+                summary["errors"].append({"row": offset + index + 1, "errors": errors})
+
+        # A SKU repeated within a chunk: the later row wins.
+        products = {attrs['sku']: Product(**attrs) for attrs in serializer.validated_data}
+        if not products:
+            return
+
+        existing = set(Product.objects.filter(sku__in=products.keys()).values_list('sku', flat=True))
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products.values(),
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=self.update_fields,
+            )
+        summary["updated"] += len(existing)
+        summary["created"] += len(products) - len(existing)
+
+
+# Incremental sync feed of changed and deleted products
+class ProductChangesAPIView(RateLimitBodyMixin, generics.GenericAPIView):
+    pagination_class = None
+
+    @swagger_auto_schema(
+        operation_description="List products changed or deleted since a cursor, oldest first. "
+                              "Start without ?since and pass the returned 'next' cursor on the "
+                              "following call; it is returned even when there are no new changes.",
+        operation_summary="Retrieve catalog changes since a cursor.",
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            cache_key = product_cache.response_cache_key(request)
+            entry = product_cache.get_entry(cache_key)
+            if entry is not None:
+                return product_cache.entry_response(request, entry, hit=True)
+            # Held-back changes become visible without a catalog write, so
+            # a page is cached no longer than the feed's lag.
+            timeout = min(ProductChangeFeed.get_lag(), product_cache.get_timeout())
+            entry = product_cache.set_entry(cache_key, ProductChangeFeed(request).get_data(), timeout)
+            return product_cache.entry_response(request, entry, hit=False)
+        except ValidationError as e:
+            return Response({"error": e.detail},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+
+# Facet counts for storefront filters
+class ProductFacetsAPIView(RateLimitBodyMixin, generics.GenericAPIView):
+    pagination_class = None
+
+    @swagger_auto_schema(
+        operation_description="Count products per category, stock status and price band. "
+                              "Accepts the same filters as the product list.",
+        operation_summary="Retrieve product facet counts.",
+        query_serializer=ProductFilterSerializer,
+    )
+    def get(self, request, *args, **kwargs):
+        filters = ProductFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response({"error": filters.errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not filters.validated_data:
+            # Whole-catalog counts are kept current incrementally.
+            return Response(product_facets.summarize(product_facets.catalog_cells()))
+        cache_key = product_cache.response_cache_key(request)
+        entry = product_cache.get_entry(cache_key)
+        if entry is not None:
+            return product_cache.entry_response(request, entry, hit=True)
+        cells = product_facets.count_cells(filters.filter(Product.objects.all()))
+        entry = product_cache.set_entry(cache_key, product_facets.summarize(cells))
+        return product_cache.entry_response(request, entry, hit=False)
+
+
+# Full-text search over name, category and description
+class ProductSearchAPIView(RateLimitBodyMixin, generics.GenericAPIView):
+    serializer_class = ProductSerializer
+    pagination_class = None
+    search_query_param = 'q'
+    limit_query_param = 'limit'
+    default_limit = 20
+    max_limit = 100
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    @swagger_auto_schema(
+        operation_description="Search products by name, category and description, best match first.",
+        operation_summary="Search the product catalog.",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get(self.search_query_param, '').strip()
+        if not query:
+            return Response({"error": "The q parameter is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        cache_key = product_cache.response_cache_key(request)
+        entry = product_cache.get_entry(cache_key)
+        if entry is not None:
+            return product_cache.entry_response(request, entry, hit=True)
+        results = []
+        for product in search_products(query, self.get_limit(request)):
+            data = self.get_serializer(product).data
+            data['rank'] = product.rank
+            results.append(data)
+        entry = product_cache.set_entry(cache_key, {"query": query, "results": results})
+        return product_cache.entry_response(request, entry, hit=False)
+
+
+# Streaming export of the whole catalog
+class ProductExportAPIView(RateLimitBodyMixin, generics.GenericAPIView):
+    queryset = Product.objects.all().order_by('id')
+    pagination_class = None
+    output_query_param = 'output'
+    chunk_size = 2000
+    buffer_size = 64 * 1024
+
+    @swagger_auto_schema(
+        operation_description="Stream every product as NDJSON (default) or CSV with ?output=csv. "
+                              "Rows are read in chunks from a server-side cursor, so memory use "
+                              "does not grow with the catalog.",
+        operation_summary="Export the full product catalog.",
+        manual_parameters=[
+            openapi.Parameter('output', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=list(export.FORMATS), default='ndjson'),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get(self.output_query_param, 'ndjson')
+        if output not in export.FORMATS:
+            return Response({"error": f"output must be one of: {', '.join(export.FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        write_lines, content_type = export.FORMATS[output]
+        rows = self.get_queryset().values(*export.EXPORT_FIELDS).iterator(chunk_size=self.chunk_size)
+        response = StreamingHttpResponse(
+            export.buffered(write_lines(rows, export.EXPORT_FIELDS), self.buffer_size),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="products.{output}"'
+        return response
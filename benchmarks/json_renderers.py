@@ -0,0 +1,93 @@
+"""
+Compare DRF's JSONRenderer with the orjson-backed ORJSONRenderer.
+
+Renders a product list as the serializers hand it over (strings for prices
+and timestamps, long descriptions) and a payment list with raw Decimal
+amounts and datetimes, and prints the time per render for each renderer as
+JSON:
+
+    python benchmarks/json_renderers.py --rows 1000 --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(USE_TZ=True, INSTALLED_APPS=['rest_framework'])
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from pulse_common.renderers import ORJSONRenderer, orjson  # noqa: E402
+
+
+def product_rows(count):
+    return [
+        {
+            'id': i,
+            'name': f'Product {i}',
+            'category': 'Gadgets',
+            'price': str(Decimal('19.99') + i),
+            'stock_status': 'in_stock',
+            'sku': f'SKU-{i:08d}',
+            'description': 'A reasonably long product description. ' * 8,
+            'created_at': '2025-01-01T00:00:00Z',
+            'updated_at': f'2025-01-01T00:00:00.{i % 1000000:06d}Z',
+        }
+        for i in range(count)
+    ]
+
+
+def payment_rows(count):
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            'id': i,
+            'name': 'John Doe',
+            'email': f'customer{i}@example.com',
+            'amount': Decimal('100.00') + i,
+            'status': 'completed',
+            'gateway': 'paystack',
+            'transaction_id': f'PAYSTACK-TX-{i:026d}',
+            'created_at': now + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def measure(renderer, data, repeat):
+    renderer.render(data)  # warm up
+    best = min(timeit.repeat(lambda: renderer.render(data), number=repeat, repeat=3))
+    return best / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    results = {'orjson': orjson.__version__ if orjson else None, 'rows': args.rows, 'payloads': {}}
+    for name, data in (('products', product_rows(args.rows)), ('payments', payment_rows(args.rows))):
+        default_ms = measure(JSONRenderer(), data, args.repeat)
+        orjson_ms = measure(ORJSONRenderer(), data, args.repeat)
+        results['payloads'][name] = {
+            'bytes': len(JSONRenderer().render(data)),
+            'json_renderer_ms': round(default_ms, 3),
+            'orjson_renderer_ms': round(orjson_ms, 3),
+            'speedup': round(default_ms / orjson_ms, 2),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
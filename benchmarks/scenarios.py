@@ -0,0 +1,236 @@
+"""
+Benchmark scenarios for both services.
+
+A scenario seeds what it needs once, then ``request(client, i)`` issues its
+i-th request through Django's test client and returns the response. Only
+this module imports project code, after run.py has configured Django for the
+selected project.
+"""
+import json
+from decimal import Decimal
+
+from django.urls import reverse
+
+
+def client_ip(i):
+    """A distinct address per request, so per-IP throttles don't interfere."""
+    return f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}'
+
+
+class Scenario:
+    # Statuses that count as success; anything else is reported as an error.
+    expected = (200,)
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+
+    def setup(self):
+        pass
+
+    def request(self, client, i):
+        raise NotImplementedError
+
+    def get(self, client, path, i, data=None, cacheable=True):
+        data = dict(data or {})
+        if cacheable and not self.options.cache_hits:
+            # A unique URL misses the response cache every time.
+            data['_bench'] = i
+        return client.get(path, data, REMOTE_ADDR=client_ip(i))
+
+    def post(self, client, path, body, i):
+        return client.post(path, json.dumps(body), content_type='application/json', REMOTE_ADDR=client_ip(i))
+
+
+# Products (Backend_Stage_4)
+
+def seed_products(count):
+    from products.models import Product
+
+    if Product.objects.exists():
+        return
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f'Product {i}',
+                category=f'Category {i % 20}',
+                price=Decimal('5.00') + i % 500,
+                stock_status='in_stock' if i % 7 else 'out_of_stock',
+                sku=f'SEED-{i:08d}',
+                description='A reasonably long product description. ' * 8,
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+class ProductListPage(Scenario):
+    def __init__(self, name, options, depth):
+        super().__init__(name, options)
+        self.depth = depth
+
+    def setup(self):
+        from rest_framework.settings import api_settings
+
+        seed_products(self.options.products)
+        last = max((self.options.products + api_settings.PAGE_SIZE - 1) // api_settings.PAGE_SIZE, 1)
+        self.page = {'first': 1, 'middle': max(last // 2, 1), 'last': last}[self.depth]
+
+    def request(self, client, i):
+        return self.get(client, reverse('product-list-create'), i, {'page': self.page})
+
+
+class ProductListCursor(Scenario):
+    """A keyset page as deep into the catalog as the last offset page."""
+    def setup(self):
+        from products.models import Product
+        from products.pagination import ProductKeysetPagination
+
+        seed_products(self.options.products)
+        last_id = Product.objects.order_by('-id').values_list('id', flat=True)[10]
+        self.cursor = ProductKeysetPagination().encode_cursor([last_id])
+
+    def request(self, client, i):
+        return self.get(client, reverse('product-list-create'), i, {'cursor': self.cursor})
+
+
+class ProductDetail(Scenario):
+    def setup(self):
+        from products.models import Product
+
+        seed_products(self.options.products)
+        self.ids = list(Product.objects.values_list('id', flat=True)[:1000])
+
+    def request(self, client, i):
+        return self.get(client, reverse('product-detail', args=[self.ids[i % len(self.ids)]]), i)
+
+
+class ProductBulkUpsert(Scenario):
+    def request(self, client, i):
+        rows = [
+            {
+                'name': f'Bulk {i}-{n}',
+                'category': 'Bulk',
+                'price': '9.99',
+                'stock_status': 'in_stock',
+                'sku': f'BULK-{i}-{n}',
+                'description': 'Imported',
+            }
+            for n in range(self.options.batch)
+        ]
+        return self.post(client, reverse('product-bulk-upsert'), rows, i)
+
+
+class ProductThrottled(Scenario):
+    """Requests from one address that is already over its rate limit."""
+    expected = (429,)
+    address = '10.255.255.255'
+
+    def setup(self):
+        from django.test import Client
+        from products.models import Product
+
+        seed_products(self.options.products)
+        self.path = reverse('product-detail', args=[Product.objects.values_list('id', flat=True).first()])
+        client = Client()
+        for _ in range(10000):
+            if client.get(self.path, REMOTE_ADDR=self.address).status_code == 429:
+                break
+
+    def request(self, client, i):
+        return client.get(self.path, REMOTE_ADDR=self.address)
+
+
+# Payments (Backend_Stage_3)
+
+def payment_body(i):
+    return {
+        'name': 'Benchmark Customer',
+        'email': f'customer{i}@example.com',
+        'amount': '100.00',
+        'gateway': ('paypal', 'paystack', 'flutterwave')[i % 3],
+    }
+
+
+def seed_payments(count):
+    from VendorPays.models import Payment, generate_transaction_id
+
+    if Payment.objects.exists():
+        return
+    Payment.objects.bulk_create(
+        [
+            Payment(
+                status='completed',
+                transaction_id=generate_transaction_id(body['gateway']),
+                **body,
+            )
+            for body in map(payment_body, range(count))
+        ],
+        batch_size=1000,
+    )
+
+
+class PaymentCreateBurst(Scenario):
+    expected = (202,)
+
+    def request(self, client, i):
+        return self.post(client, reverse('payments:payment-list'), payment_body(i), i)
+
+
+class PaymentBulkCreate(Scenario):
+    expected = (202,)
+
+    def request(self, client, i):
+        body = [payment_body(i * self.options.batch + n) for n in range(self.options.batch)]
+        return self.post(client, reverse('payments:payment-bulk'), body, i)
+
+
+class PaymentList(Scenario):
+    def setup(self):
+        seed_payments(self.options.payments)
+
+    def request(self, client, i):
+        return self.get(client, reverse('payments:payment-list'), i, {'gateway': 'paystack'}, cacheable=False)
+
+
+class PaymentDetail(Scenario):
+    def setup(self):
+        from VendorPays.models import Payment
+
+        seed_payments(self.options.payments)
+        self.ids = list(Payment.objects.values_list('id', flat=True)[:1000])
+
+    def request(self, client, i):
+        path = reverse('payments:payment-detail', args=[self.ids[i % len(self.ids)]])
+        return self.get(client, path, i, cacheable=False)
+
+
+PROJECTS = {
+    'products': {
+        'path': 'Backend_Stage_4',
+        'settings': 'BUSINESS_API.settings',
+        'scenarios': {
+            'list_first_page': lambda options: ProductListPage('list_first_page', options, 'first'),
+            'list_middle_page': lambda options: ProductListPage('list_middle_page', options, 'middle'),
+            'list_last_page': lambda options: ProductListPage('list_last_page', options, 'last'),
+            'list_cursor_deep': lambda options: ProductListCursor('list_cursor_deep', options),
+            'detail': lambda options: ProductDetail('detail', options),
+            'bulk_upsert': lambda options: ProductBulkUpsert('bulk_upsert', options),
+            'throttled': lambda options: ProductThrottled('throttled', options),
+        },
+    },
+    'payments': {
+        'path': 'Backend_Stage_3',
+        'settings': 'PAYMENTS.settings',
+        # Queue gateway calls instead of running them in a background thread
+        # that would compete with the measured requests.
+        'overrides': {'PAYMENT_DISPATCH_MODE': 'outbox'},
+        'scenarios': {
+            'create_burst': lambda options: PaymentCreateBurst('create_burst', options),
+            'bulk_create': lambda options: PaymentBulkCreate('bulk_create', options),
+            'list': lambda options: PaymentList('list', options),
+            'detail': lambda options: PaymentDetail('detail', options),
+        },
+    },
+}
@@ -0,0 +1,8 @@
+"""
+Code shared by the Backend_Stage_3 (PAYMENTS) and Backend_Stage_4
+(BUSINESS_API) services: database settings, replica routing, orjson
+rendering and request instrumentation.
+
+Each project's settings put the repository root on sys.path; the Docker
+images copy this package next to the project.
+"""
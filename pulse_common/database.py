@@ -0,0 +1,134 @@
+"""
+Database settings for both services, tunable from the environment.
+
+The database comes from DATABASE_URL, or DB_NAME/DB_USER/DB_PASSWORD/
+DB_HOST/DB_PORT. For PostgreSQL, connection handling is controlled by:
+
+DB_CONN_MAX_AGE         Seconds a worker keeps its connection open across
+                        requests (default 60; 0 closes it after every
+                        request, "none" keeps it forever). Defaults to 0
+                        with SERVER=uvicorn, where connections are not
+                        reused safely between requests; use DB_POOL there.
+DB_CONN_HEALTH_CHECKS   Check a reused connection before a request uses it
+                        (default true).
+DB_POOL                 "true" to use a psycopg 3 connection pool in every
+                        worker process instead (pip install
+                        "psycopg[binary,pool]").
+DB_POOL_MIN_SIZE        Connections each pool keeps open (default 1).
+DB_POOL_MAX_SIZE        Connections each pool may open. Defaults to one per
+                        worker thread (at least 4), capped at
+                        DB_MAX_CONNECTIONS / WEB_CONCURRENCY so all workers
+                        together stay within the budget.
+WEB_THREADS             Threads per worker process, for sizing the pool
+                        (defaults to --threads in GUNICORN_CMD_ARGS, or 1).
+DB_POOL_TIMEOUT         Seconds to wait for a free pooled connection (10).
+DB_STATEMENT_TIMEOUT    Milliseconds before the server cancels a query
+                        (default 0, no limit).
+DB_CONNECT_TIMEOUT      Seconds to wait when opening a connection (10).
+
+DATABASE_REPLICA_URLS   Comma-separated read replica URLs, added as
+                        "replica1", "replica2", ... and tuned the same way.
+                        Reads are routed to them by routers.ReplicaRouter.
+"""
+import os
+import shlex
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def conn_max_age():
+    default = '0' if os.getenv('SERVER') == 'uvicorn' else '60'
+    value = os.getenv('DB_CONN_MAX_AGE', default)
+    return None if value.lower() == 'none' else int(value)
+
+
+def worker_threads():
+    threads = env_int('WEB_THREADS', None)
+    if threads is None:
+        args = shlex.split(os.getenv('GUNICORN_CMD_ARGS', ''))
+        for index, arg in enumerate(args):
+            if arg == '--threads' and index + 1 < len(args):
+                threads = int(args[index + 1])
+            elif arg.startswith('--threads='):
+                threads = int(arg.split('=', 1)[1])
+    return max(threads or 1, 1)
+
+
+def pool_options():
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured('DB_POOL needs psycopg 3 with its pool: pip install "psycopg[binary,pool]".')
+    budget = env_int('DB_MAX_CONNECTIONS', None)
+    workers = max(env_int('WEB_CONCURRENCY', 1), 1)
+    # Every thread of a worker may hold a connection at once.
+    max_size = max(worker_threads(), 4)
+    if budget:
+        max_size = max(min(max_size, budget // workers), 1)
+    max_size = env_int('DB_POOL_MAX_SIZE', max_size)
+    return {
+        'min_size': min(env_int('DB_POOL_MIN_SIZE', 1), max_size),
+        'max_size': max_size,
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    }
+
+
+def default_database(default_name):
+    url = os.getenv('DATABASE_URL')
+    if url:
+        config = dj_database_url.parse(url)
+    else:
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', default_name),
+            'USER': os.getenv('DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DB_PASSWORD', 'postgres'),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+        }
+    return tune(config)
+
+
+def replica_databases():
+    urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    replicas = {}
+    for number, url in enumerate(urls, 1):
+        config = tune(dj_database_url.parse(url))
+        # Tests only create the primary; replicas read from it there.
+        config['TEST'] = {'MIRROR': DEFAULT_DB_ALIAS}
+        replicas[f'replica{number}'] = config
+    return replicas
+
+
+def tune(config):
+    if config['ENGINE'] != 'django.db.backends.postgresql':
+        # e.g. SQLite for local runs and tests: nothing to tune.
+        return config
+
+    options = config.setdefault('OPTIONS', {})
+    options['connect_timeout'] = env_int('DB_CONNECT_TIMEOUT', 10)
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT', 0)
+    if statement_timeout:
+        options['options'] = f'-c statement_timeout={statement_timeout}'
+    if env_bool('DB_POOL', False):
+        options['pool'] = pool_options()
+        # Django refuses persistent connections on top of a pool.
+        config['CONN_MAX_AGE'] = 0
+    else:
+        config['CONN_MAX_AGE'] = conn_max_age()
+        config['CONN_HEALTH_CHECKS'] = env_bool('DB_CONN_HEALTH_CHECKS', True)
+    return config
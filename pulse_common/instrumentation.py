@@ -0,0 +1,296 @@
+import bisect
+import contextlib
+import contextvars
+import os
+import random
+import socket
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# Upper bounds (seconds) of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A worker that hasn't published for this long is dropped from /metrics.
+WORKER_SNAPSHOT_TTL = 600
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def workers_key():
+    # Per service (URLconf), in case several services share one Redis.
+    return f'metrics:{settings.ROOT_URLCONF}:workers'
+
+
+def worker_key(worker):
+    return f'metrics:{settings.ROOT_URLCONF}:worker:{worker}'
+
+
+class RequestMetrics:
+    """Timing breakdown of one sampled request."""
+    def __init__(self):
+        self.db_queries = 0
+        # Other timers (e.g. 'throttle') are added as they run.
+        self.timings = {'db': 0.0, 'serializer': 0.0, 'render': 0.0}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # Called by time_query() for every query of the request.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.timings['db'] += time.perf_counter() - started
+
+    def server_timing(self, total):
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.timings.items()]
+        parts[0] += f';desc="{self.db_queries} queries"'
+        parts.append(f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+@contextlib.contextmanager
+def timer(name):
+    """Add the time spent in the block to ``name`` for the current request, if sampled."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def time_query(execute, sql, params, many, context):
+    """execute_wrapper on every connection: times the queries of sampled requests."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+# On every connection, in whichever thread it is opened: under ASGI, queries
+# run in sync_to_async threads, and the request's metrics follow them there
+# through the context.
+connection_created.connect(install_query_timer)
+
+
+def record_cache(hit):
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+class MetricsRegistry:
+    """
+    Prometheus metrics for one worker process: a latency histogram for every
+    request, plus breakdown counters summed over sampled requests, per route.
+
+    Every worker publishes a snapshot to the shared cache at most every
+    METRICS_PUBLISH_INTERVAL seconds, and /metrics renders the snapshots of
+    all workers of the service, each under its own ``worker`` label, so every
+    series stays monotonic whichever worker answers the scrape. Without a
+    shared cache (REDIS_URL) only the answering worker's metrics are shown.
+    """
+    def __init__(self, worker=None):
+        self.worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.published = None
+
+    def observe(self, route, method, seconds):
+        with self.lock:
+            histogram = self.histograms.get((route, method))
+            if histogram is None:
+                histogram = self.histograms[(route, method)] = [[0] * len(LATENCY_BUCKETS), 0, 0.0]
+            index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(LATENCY_BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+
+    def add_sample(self, route, metrics):
+        values = {
+            'sampled_requests_total': 1,
+            'db_queries_total': metrics.db_queries,
+            'cache_hits_total': metrics.cache_hits,
+            'cache_misses_total': metrics.cache_misses,
+        }
+        for name, seconds in metrics.timings.items():
+            values[f'{name}_seconds_total'] = seconds
+        with self.lock:
+            for name, value in values.items():
+                self.counters[(name, route)] = self.counters.get((name, route), 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': {key: [list(buckets), count, total]
+                               for key, (buckets, count, total) in self.histograms.items()},
+                'counters': dict(self.counters),
+            }
+
+    def publish_due(self):
+        interval = getattr(settings, 'METRICS_PUBLISH_INTERVAL', 5)
+        return self.published is None or time.monotonic() - self.published >= interval
+
+    def publish(self):
+        """Store this worker's snapshot in the shared cache and list the worker there."""
+        self.published = time.monotonic()
+        cache.set(worker_key(self.worker), self.snapshot(), WORKER_SNAPSHOT_TTL)
+        workers = cache.get(workers_key()) or []
+        if self.worker not in workers:
+            # A racing worker may drop this entry; the next publish adds it back.
+            cache.set(workers_key(), workers + [self.worker], None)
+
+    def collect(self):
+        """Snapshots of every worker that published recently, by worker."""
+        self.publish()
+        workers = cache.get(workers_key()) or []
+        found = cache.get_many([worker_key(worker) for worker in workers])
+        snapshots = {worker: found[worker_key(worker)] for worker in workers if worker_key(worker) in found}
+        if len(snapshots) < len(workers):
+            cache.set(workers_key(), list(snapshots), None)
+        snapshots[self.worker] = self.snapshot()
+        return snapshots
+
+    def render(self):
+        snapshots = sorted(self.collect().items())
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route name.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for worker, snapshot in snapshots:
+            for (route, method), (buckets, count, total) in sorted(snapshot['histograms'].items()):
+                labels = f'route="{route}",method="{method}",worker="{worker}"'
+                cumulative = 0
+                for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {total}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+        names = sorted({name for _, snapshot in snapshots for name, _ in snapshot['counters']})
+        for name in names:
+            lines.append(f'# TYPE http_request_{name} counter')
+            for worker, snapshot in snapshots:
+                for (counter, route), value in sorted(snapshot['counters'].items()):
+                    if counter == name:
+                        lines.append(f'http_request_{name}{{route="{route}",worker="{worker}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None and match.view_name else 'unmatched'
+
+
+class PerformanceMiddleware:
+    """
+    Times every request into the per-route latency histogram.
+
+    A PERF_SAMPLE_RATE fraction of requests is also broken down into DB
+    queries (count and time, see ``time_query``), serializer and render
+    time, cache hits/misses and any other ``timer()`` blocks. That breakdown
+    is returned in a Server-Timing header and added to the /metrics counters.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        metrics = self.start(request)
+        if metrics is None:
+            response = self.get_response(request)
+        else:
+            with self.instrument(metrics):
+                response = self.get_response(request)
+        response = self.finish(request, response, metrics, started)
+        if registry.publish_due():
+            registry.publish()
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        metrics = self.start(request)
+        if metrics is None:
+            response = await self.get_response(request)
+        else:
+            with self.instrument(metrics):
+                response = await self.get_response(request)
+        response = self.finish(request, response, metrics, started)
+        if registry.publish_due():
+            await sync_to_async(registry.publish, thread_sensitive=False)()
+        return response
+
+    def start(self, request):
+        if random.random() >= getattr(settings, 'PERF_SAMPLE_RATE', 1.0):
+            return None
+        return RequestMetrics()
+
+    @contextlib.contextmanager
+    def instrument(self, metrics):
+        # Connections opened before this module was loaded missed connection_created.
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+        token = _current.set(metrics)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns.
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+        return response
+
+    def finish(self, request, response, metrics, started):
+        now = time.perf_counter()
+        total = now - started
+        route = route_name(request)
+        registry.observe(route, request.method, total)
+        if metrics is not None:
+            if metrics.render_started is not None:
+                metrics.timings['render'] = now - metrics.render_started
+            registry.add_sample(route, metrics)
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the request metrics of every worker."""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,125 @@
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.throttling import BaseThrottle
+
+
+class RoutingState:
+    """Where the current request (or task) may read from."""
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def pin_primary():
+    """Send the rest of the current request's reads to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.pinned = True
+
+
+@contextlib.contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. in background jobs."""
+    token = _state.set(RoutingState(pinned=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random DATABASE_REPLICAS alias and writes to the primary.
+
+    Reads stay on the primary inside a transaction, for the rest of a
+    request once it has written, and for a client that wrote within the last
+    DATABASE_REPLICA_PIN_SECONDS (see PrimaryPinningMiddleware), so nobody
+    misses their own writes because a replica lags behind.
+    """
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pin_key(request):
+    # Clients are told apart the way the throttles do it.
+    return f'db:pin:{BaseThrottle().get_ident(request)}'
+
+
+class PrimaryPinningMiddleware:
+    """
+    Pins a client's reads to the primary for DATABASE_REPLICA_PIN_SECONDS
+    after any request of theirs wrote to the database. A no-op without
+    replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        key = pin_key(request)
+        state = RoutingState(pinned=cache.get(key) is not None)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            cache.set(key, 1, self.pin_seconds())
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        key = pin_key(request)
+        state = RoutingState(pinned=await cache.aget(key) is not None)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            await cache.aset(key, 1, self.pin_seconds())
+        return response
+
+    def pin_seconds(self):
+        return getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5)